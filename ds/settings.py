@@ -76,6 +76,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    # reloads endpoints changed by another process (see ds_app/registry.py)
+    'ds_app.registry.registry_middleware',
 ]
 
 ROOT_URLCONF = 'ds.urls'
@@ -156,13 +158,6 @@ USE_L10N = True
 USE_TZ = True
 
 
-# logging filter to only override endpoint log msg if a filter field and value are used
-def endpoint_override_log_filter(record):
-    if hasattr(record, 'skip'):
-        return not record.skip
-    return True
-
-
 LOGGING = {
     'version': 1,
     'formatters': {
@@ -177,9 +172,11 @@ LOGGING = {
         },
     },
     'filters': {
+        # the endpoint log level; endpoints with a log_level_override change it for their own requests only (see
+        #   ds_app/log_context.py)
         'endpoint_override_filter': {
-            '()': 'django.utils.log.CallbackFilter',
-            'callback': endpoint_override_log_filter,
+            '()': 'ds_app.log_context.EndpointLogFilter',
+            'level': 'WARNING',
         }
     },
     'handlers': {
@@ -229,7 +226,8 @@ LOGGING = {
         },
         'endpoint': {
             'handlers': ['endpoint_console'],
-            'level': 'WARNING',
+            # NOTE: the level is set on endpoint_override_filter so endpoint overrides can go lower than it
+            'level': 'DEBUG',
             'propagate': True,
             'filters': ['endpoint_override_filter'],
         },
@@ -268,6 +266,10 @@ if not isinstance(DEBUG, bool):
     #     'PORT': '3306',
     #     'USER': 'root',
     #     'PASSWORD': 'root',
+    #     # optional limits on concurrent endpoint statements (see ds_app/limits.py)
+    #     'LIMITS': {'MAX_ACTIVE': 5, 'MAX_QUEUED': 20, 'QUEUE_TIMEOUT': 10, 'RETRY_AFTER': 5},
+    #     # optional pool of open connections reused across requests (see ds_app/pool.py)
+    #     'POOL': {'MIN_SIZE': 2, 'MAX_SIZE': 10, 'TIMEOUT': 5, 'MAX_IDLE': 300},
     # },
     # 'web_cache': {
     #     'ENGINE': 'django.db.backends.mysql',
@@ -316,6 +318,47 @@ if not isinstance(DEBUG, bool):
     # }
     # }
 
+# cache used for endpoint results (see Endpoint.cache_timeout); locmem is per process so use a shared backend like
+#   memcached or redis in prod so admin changes evict results and reload endpoints for all workers
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'ds-endpoint-results',
+    }
+}
+ENDPOINT_CACHE_ALIAS = 'default'
+# seconds between checks of the shared endpoint registry generation (in ENDPOINT_CACHE_ALIAS) so endpoints changed by
+#   another process are reloaded; 0 to check on every request
+ENDPOINT_REGISTRY_CHECK_SECONDS = 5
+# number of rows read from the cursor at a time for endpoints that stream their results
+ENDPOINT_STREAM_CHUNK_SIZE = 1000
+# largest page of rows returned when paging with _limit, _offset or _after (also the default _limit); paging needs
+#   a page key field on the endpoint
+ENDPOINT_PAGE_MAX_LIMIT = 10000
+# use the async endpoint view when served under asgi; database work runs on a thread pool per connection with at most
+#   ENDPOINT_ASYNC_WORKERS threads (override per connection with ASYNC_WORKERS in endpoint_databases_dict.txt)
+ENDPOINT_ASYNC = is_true_value(os.environ.get('ENDPOINT_ASYNC', False))
+ENDPOINT_ASYNC_WORKERS = 10
+# seconds between logging the connection pool stats (checkouts, waits, timeouts...) at info on the ds_app logger;
+#   0 to turn it off
+ENDPOINT_POOL_STATS_INTERVAL = 300
+# rows read from each side at a time when diffing tables in the sync command
+SYNC_CHUNK_SIZE = 1000
+# most syncs running against one connection at a time when the sync command is run with --workers
+SYNC_WORKERS_PER_CONNECTION = 2
+# minutes without a checkpoint before a sync run that never finished is closed as failed (see sync --resume)
+SYNC_STALE_MINUTES = 60
+# seconds between heartbeats of a running sync (well under SYNC_STALE_MINUTES)
+SYNC_HEARTBEAT_SECONDS = 60
+# days of runs averaged on the sync trend admin page (compared against the same number of days before that)
+SYNC_TREND_DAYS = 30
+# lines kept by a LogBuffer (sync run logs); the first and last half are kept with a marker for the lines left out
+LOG_BUFFER_MAX_LINES = 20000
+# directory the whole log is written to once a LogBuffer starts leaving lines out (None to not keep them)
+LOG_BUFFER_SPILL_DIR = None
+# seconds table metadata (columns and keys) is cached for when validating sync configurations
+SCHEMA_CACHE_TTL = 300
+
 # allow all apis to be accessible from different origins
 CORS_ALLOW_ALL_ORIGINS = True
 
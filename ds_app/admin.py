@@ -6,6 +6,8 @@ from import_export.admin import ImportExportActionModelAdmin
 from django.utils.html import format_html
 
 from .models import Endpoint
+from .registry import endpoint_registry
+from .result_cache import evict_endpoint
 from .utils import reload_app_urls
 
 
@@ -21,6 +23,11 @@ class EndpointResource(resources.ModelResource):
 @receiver(post_import, dispatch_uid='ds_app_import')
 def _post_import(model, **kwargs):
     # model is the actual model instance which after import
+    # NOTE: we don't know which endpoints changed so evict cached results for all of them
+    for path in Endpoint.objects.values_list('path', flat=True):
+        evict_endpoint(path)
+    # NOTE: bulk imports skip the save signals so tell the other processes here
+    endpoint_registry.invalidate()
     reload_app_urls()
 
 
@@ -36,17 +43,23 @@ class EndpointAdmin(ImportExportActionModelAdmin):
 
     def save_model(self, request, obj, form, change):
         super().save_model(request, obj, form, change)
+        # evict cached results for the old path too in case it was changed
+        evict_endpoint(form.initial.get('path'))
+        evict_endpoint(obj.path)
         # instance = form.save(commit=False)
         # instance.modified_by = str(request.user)[:255]
         # instance.save()
         # form.save_m2m()
         # reload_urls('ds_app.urls')
+        endpoint_registry.clear()
         reload_app_urls()
         # return instance
 
     def delete_model(self, request, obj):
         super().delete_model(request, obj)
+        evict_endpoint(obj.path)
         # reload_urls('ds_app.urls')
+        endpoint_registry.clear()
         reload_app_urls()
 
     def test_link(self, obj):
@@ -3,4 +3,8 @@ from django.apps import AppConfig
 
 class DsAppConfig(AppConfig):
     name = 'ds_app'
-    verbose_name = "Database services"
\ No newline at end of file
+    verbose_name = "Database services"
+
+    def ready(self):
+        # connects the endpoint save/delete signals that invalidate the endpoint registry in other processes
+        from . import registry  # noqa: F401
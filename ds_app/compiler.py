@@ -0,0 +1,217 @@
+"""
+Compiles endpoint sql statements once into a template so requests only have to bind values and pick which optional
+[[ ]] blocks to keep.
+
+NOTE: the template has to produce exactly the same sql and parameter list as the original string parser did; that
+    includes its quirks (named parameter positions are taken after the ordinal ? replacements and the next optional
+    block is searched for from the end position of the previous block before it was stripped).  Don't "fix" these
+    here without also expecting existing endpoints to change behavior.
+"""
+import re
+from functools import lru_cache
+
+ordinal_pattern = re.compile(r'(\?(\|.\|)?)')
+# NOTE: (?!) is a negative lookahead; [\s]|[=] makes it not match if whitespace or equals
+named_pattern = re.compile(r'<(?![\s]|[=])([^>]+)>')
+
+
+class ParameterSlot(object):
+    """
+    A parameter placeholder found in the sql.  Ordinal slots get their name from the passed parameters at bind time.
+    """
+    def __init__(self, name, positions, ordinal=False, ordinal_index=-1, cast_to=None):
+        self.name = name
+        self.start = positions[0]
+        self.end = positions[1]
+        self.ordinal = ordinal
+        self.ordinal_index = ordinal_index
+        self.cast_to = cast_to
+
+    def __str__(self):
+        return self.name or f"?{self.ordinal_index}"
+
+
+class OptionalBlock(object):
+    """
+    A [[ ]] block in the uncommented sql and the slots (by index) that fall within it
+    """
+    def __init__(self, start, end, slot_indexes):
+        self.start = start
+        self.end = end
+        self.slot_indexes = slot_indexes
+
+
+class RenderedSql(object):
+    """
+    The statement after choosing which optional blocks are kept along with the callable layout for that statement
+    """
+    def __init__(self, statement, removed_slot_indexes):
+        self.statement = statement
+        self.removed_slot_indexes = removed_slot_indexes
+        self.has_call = False
+        self.callable = False
+        self.callable_name = ""
+        self.callable_args = []
+        self.callable_value_indexes = []
+        self.parse_callproc()
+
+    def parse_callproc(self):
+        # mysqlclient uses the procedure name and a list of args in callproc method
+        sql = self.statement
+        upper_sql = sql.upper()
+        pos = upper_sql.find("CALL ")
+        if pos > -1:
+            self.has_call = True
+            pos += len("CALL ")
+            pos_argstart = upper_sql.find("(", pos)
+            pos_argend = upper_sql.rfind(")", pos)
+            if pos_argstart > -1 and pos_argend > -1:
+                self.callable = True
+                self.callable_name = sql[pos:pos_argstart].strip()
+                self.callable_args = sql[pos_argstart + 1: pos_argend].lower().split(",")
+                for arg_idx, arg in enumerate(self.callable_args):
+                    if arg and arg.strip() == "%s":
+                        self.callable_value_indexes.append(arg_idx)
+
+
+class SqlTemplate(object):
+    """
+    Compiled form of an endpoint statement: parameter slots with their cast types, optional block boundaries and a
+    cache of rendered statements by which blocks were stripped
+    """
+    def __init__(self, sql):
+        self.original_sql = sql
+        self.uncommented_sql = strip_comments(sql)
+        self.slots = []
+        self.ordinal_count = 0
+        sql = self.compile_ordinal_args(self.uncommented_sql)
+        sql = self.compile_named_args(sql)
+        self.parsed_sql = sql
+        self.blocks = self.compile_optional_blocks()
+        self._rendered = {}
+
+    def compile_ordinal_args(self, sql):
+        new_sql = ""
+        last_match = 0
+        for match in ordinal_pattern.finditer(sql):
+            # look for a |<cast char>| and perform casting on value
+            # NOTE: for backwards compatibility with java strip anything we don't think we need in python
+            group = match.group(1)
+            cast_to = None
+            pos_cast_start = group.find("|")
+            pos_cast_end = group.rfind("|")
+            if pos_cast_start > -1 and pos_cast_end > -1:
+                cast_to = group[pos_cast_start + 1:pos_cast_end]
+            self.slots.append(ParameterSlot(None, match.span(), ordinal=True, ordinal_index=self.ordinal_count,
+                                            cast_to=cast_to))
+            self.ordinal_count += 1
+            new_sql += sql[last_match:match.start()]
+            new_sql += '%s'
+            last_match = match.end()
+        new_sql += sql[last_match:]
+        return new_sql
+
+    def compile_named_args(self, sql):
+        new_sql = ""
+        last_match = 0
+        for match in named_pattern.finditer(sql):
+            # if we have a name that is parseable like <int: name> then set cast_to and reset name
+            name = match.group(1)
+            cast_to = None
+            pos_cast_delim = name.find(":")
+            if pos_cast_delim > -1:
+                cast_to = name[:pos_cast_delim]
+                name = name[pos_cast_delim + 1:].strip()
+            self.slots.append(ParameterSlot(name, match.span(), cast_to=cast_to))
+            new_sql += sql[last_match:match.start()]
+            new_sql += '%s'
+            last_match = match.end()
+        new_sql += sql[last_match:]
+        return new_sql
+
+    def compile_optional_blocks(self):
+        blocks = []
+        us = self.uncommented_sql
+        us_pos_start = us.find('[[')
+        us_pos_end = us.find(']]', us_pos_start) if us_pos_start > -1 else -1
+        while us_pos_start > -1 and us_pos_end > -1:
+            slot_indexes = [
+                idx for idx, slot in enumerate(self.slots)
+                if slot.start >= us_pos_start and slot.end <= us_pos_end
+            ]
+            blocks.append(OptionalBlock(us_pos_start, us_pos_end, slot_indexes))
+            us_pos_start = us.find('[[', us_pos_end)
+            us_pos_end = us.find(']]', us_pos_start) if us_pos_start > -1 else -1
+        return blocks
+
+    def slot_names(self, parameter_keys):
+        """
+        returns the parameter name for each slot; ordinal slots are named by the position of the passed parameters
+        """
+        names = []
+        for slot in self.slots:
+            if slot.ordinal:
+                if slot.ordinal_index < len(parameter_keys):
+                    names.append(parameter_keys[slot.ordinal_index])
+                else:
+                    names.append(f"p{slot.ordinal_index}")
+            else:
+                names.append(slot.name)
+        return names
+
+    def missing_blocks(self, slot_names, parameters):
+        """
+        returns a tuple of flags for each optional block; a block is missing if the first parameter within it was
+        not passed
+        """
+        return tuple(
+            bool(block.slot_indexes) and slot_names[block.slot_indexes[0]] not in parameters
+            for block in self.blocks
+        )
+
+    def render(self, missing):
+        """
+        returns the rendered sql for a tuple of missing block flags; cached since there are only a few combinations
+        """
+        rendered = self._rendered.get(missing)
+        if rendered is None:
+            rendered = self._render(missing)
+            self._rendered[missing] = rendered
+        return rendered
+
+    def _render(self, missing):
+        s = self.parsed_sql
+        removed = set()
+        s_pos_start = s.find('[[')
+        s_pos_end = s.find(']]', s_pos_start) if s_pos_start > -1 else -1
+        block_idx = 0
+        while block_idx < len(self.blocks) and s_pos_start > -1 and s_pos_end > -1:
+            if missing[block_idx]:
+                # remove any parameters within range (otherwise we will get the param not passed error)
+                removed.update(self.blocks[block_idx].slot_indexes)
+                # strip the whole block from the sql
+                s = s[0:s_pos_start] + s[s_pos_end + 2:]
+            else:
+                # strip only the open/close bracket tag
+                s = s[0:s_pos_start] + s[s_pos_start + 2:s_pos_end] + s[s_pos_end + 2:]
+            block_idx += 1
+            s_pos_start = s.find('[[', s_pos_end)
+            s_pos_end = s.find(']]', s_pos_start) if s_pos_start > -1 else -1
+        return RenderedSql(s, frozenset(removed))
+
+
+def strip_comments(sql):
+    sql_lines = []
+    for line in sql.split('\n'):
+        if line.strip().startswith("--"):
+            continue
+        sql_lines.append(line + '\n')
+    return "".join(sql_lines)
+
+
+@lru_cache(maxsize=1024)
+def compile_sql(sql):
+    """
+    returns the compiled template for the sql; keyed by the statement text so edits in admin just compile a new one
+    """
+    return SqlTemplate(sql)
@@ -0,0 +1,63 @@
+"""
+Thread pools used by the async endpoint view to run database work off the event loop.  There is one bounded pool per
+connection name so a slow reporting database can only tie up its own threads.
+
+NOTE: django 3.x has no async database backends so every driver goes through a pool here
+"""
+import asyncio
+import contextvars
+import functools
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections
+
+log = logging.getLogger("ds_app")
+_executors = {}
+_lock = threading.Lock()
+
+
+def get_max_workers(connection_name):
+    """
+    returns ASYNC_WORKERS from the connection settings if set otherwise ENDPOINT_ASYNC_WORKERS
+    """
+    database = settings.DATABASES.get(connection_name) or {}
+    return database.get('ASYNC_WORKERS') or getattr(settings, 'ENDPOINT_ASYNC_WORKERS', 10)
+
+
+def get_executor(connection_name):
+    executor = _executors.get(connection_name)
+    if executor is None:
+        with _lock:
+            executor = _executors.get(connection_name)
+            if executor is None:
+                max_workers = get_max_workers(connection_name)
+                executor = ThreadPoolExecutor(max_workers=max_workers,
+                                              thread_name_prefix=f"ds-{connection_name or 'default'}")
+                _executors[connection_name] = executor
+                log.debug(f"created executor for [{connection_name}] with [{max_workers}] workers")
+    return executor
+
+
+def _call_with_connection(connection_name, func, *args):
+    # the pool threads outlive requests so do what the request started/finished signals do for a sync worker
+    connection = connections[connection_name]
+    connection.close_if_unusable_or_obsolete()
+    try:
+        return func(*args)
+    finally:
+        connection.close_if_unusable_or_obsolete()
+
+
+async def run_in_executor(connection_name, func, *args):
+    """
+    runs func(*args) on the executor for the connection and returns the result
+    NOTE: run in a copy of the caller's context so contextvars (the request's log override) carry over to the thread
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(get_executor(connection_name),
+                                      functools.partial(context.run, _call_with_connection, connection_name, func,
+                                                        *args))
@@ -0,0 +1,191 @@
+"""
+Per connection limits on how many endpoint statements can run at once.  Configured with a LIMITS dict on the
+connection in endpoint_databases_dict.txt; connections without one are not limited.
+
+    'reporting': {
+        'ENGINE': 'django.db.backends.mysql',
+        ...
+        'LIMITS': {
+            'MAX_ACTIVE': 5,        # statements running at the same time
+            'MAX_QUEUED': 20,       # requests allowed to wait for a slot; more are rejected right away
+            'QUEUE_TIMEOUT': 10,    # seconds a request waits for a slot before it is rejected
+            'RETRY_AFTER': 5,       # seconds sent back in the Retry-After header when rejected
+        },
+    },
+
+NOTE: limits are per process; with several workers the database sees up to workers * MAX_ACTIVE statements
+"""
+import asyncio
+import collections
+import contextvars
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+log = logging.getLogger("ds_app")
+_limiters = {}
+_lock = threading.Lock()
+# connection names the current request already holds a slot for (see holding_slot)
+_held = contextvars.ContextVar('held_connection_slots', default=frozenset())
+
+
+class ConnectionBusy(Exception):
+    """
+    raised when a statement can't get a slot on the connection; the view turns this into a 503
+    """
+    def __init__(self, connection_name, retry_after):
+        super().__init__(f"Connection [{connection_name}] is busy; try again later")
+        self.connection_name = connection_name
+        self.retry_after = retry_after
+
+
+class ConnectionLimiter(object):
+    """
+    A semaphore with a bounded wait queue and timeout
+    """
+    def __init__(self, connection_name, max_active, max_queued=0, queue_timeout=None, retry_after=1):
+        self.connection_name = connection_name
+        self.max_active = max_active
+        self.max_queued = max_queued
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self.active = 0
+        self.waiting = 0
+        self.rejected = 0
+        self._condition = threading.Condition()
+        self._async_waiters = collections.deque()
+
+    def acquire(self):
+        with self._condition:
+            if self.active < self.max_active:
+                self.active += 1
+                return
+            if self.waiting >= self.max_queued:
+                self.reject()
+            self.waiting += 1
+            try:
+                deadline = time.monotonic() + self.queue_timeout if self.queue_timeout else None
+                while self.active >= self.max_active:
+                    remaining = deadline - time.monotonic() if deadline else None
+                    if remaining is not None and remaining <= 0:
+                        self.reject()
+                    self._condition.wait(remaining)
+                self.active += 1
+            finally:
+                self.waiting -= 1
+
+    async def acquire_async(self):
+        """
+        acquire for the event loop; waits on a future instead of blocking the loop and shares the queue limit and
+        timeout with acquire
+        """
+        loop = asyncio.get_running_loop()
+        with self._condition:
+            if self.active < self.max_active:
+                self.active += 1
+                return
+            if self.waiting >= self.max_queued:
+                self.reject()
+            self.waiting += 1
+            future = loop.create_future()
+            self._async_waiters.append((loop, future))
+        timed_out = False
+        try:
+            await asyncio.wait_for(future, self.queue_timeout or None)
+        except asyncio.TimeoutError:
+            timed_out = True
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # got the slot just as the request was cancelled
+                self.release()
+            raise
+        finally:
+            with self._condition:
+                self.waiting -= 1
+        if timed_out:
+            with self._condition:
+                self.reject()
+
+    def reject(self):
+        self.rejected += 1
+        log.warning(f"rejected statement for [{self.connection_name}]; "
+                    f"active: {self.active} waiting: {self.waiting}")
+        raise ConnectionBusy(self.connection_name, self.retry_after)
+
+    def release(self):
+        with self._condition:
+            while self._async_waiters:
+                loop, future = self._async_waiters.popleft()
+                if not future.done():
+                    # hand the slot straight to the waiting request so active stays the same
+                    loop.call_soon_threadsafe(self._grant, future)
+                    return
+            self.active -= 1
+            self._condition.notify()
+
+    def _grant(self, future):
+        if future.done():
+            # the request timed out (or went away) after the slot was handed to it
+            self.release()
+        else:
+            future.set_result(True)
+
+    def __str__(self):
+        return (f"{self.connection_name}: active {self.active}/{self.max_active} "
+                f"waiting {self.waiting}/{self.max_queued}")
+
+
+def get_limiter(connection_name):
+    """
+    returns the limiter for the connection or None if the connection has no LIMITS
+    """
+    if connection_name in _limiters:
+        return _limiters[connection_name]
+    with _lock:
+        if connection_name not in _limiters:
+            database = settings.DATABASES.get(connection_name) or {}
+            limits = database.get('LIMITS')
+            limiter = None
+            if limits and limits.get('MAX_ACTIVE'):
+                limiter = ConnectionLimiter(connection_name, limits['MAX_ACTIVE'],
+                                            max_queued=limits.get('MAX_QUEUED', 0),
+                                            queue_timeout=limits.get('QUEUE_TIMEOUT'),
+                                            retry_after=limits.get('RETRY_AFTER', 1))
+            _limiters[connection_name] = limiter
+    return _limiters[connection_name]
+
+
+@contextmanager
+def connection_slot(connection_name):
+    """
+    holds a slot on the connection for the duration of the with block (no-op if not limited)
+    """
+    limiter = get_limiter(connection_name)
+    if limiter is None or is_slot_held(connection_name):
+        yield
+        return
+    limiter.acquire()
+    try:
+        yield
+    finally:
+        limiter.release()
+
+
+def is_slot_held(connection_name):
+    return connection_name in _held.get()
+
+
+@contextmanager
+def holding_slot(connection_name):
+    """
+    marks the slot on the connection as already held by the current request (the async view acquires it on the event
+    loop before handing the work to the executor) so connection_slot doesn't take a second one
+    """
+    token = _held.set(_held.get() | {connection_name})
+    try:
+        yield
+    finally:
+        _held.reset(token)
@@ -0,0 +1,76 @@
+"""
+Per request log level overrides for the endpoint logger.  An endpoint's log_level_override (and log filter field) is
+kept in a contextvar for the request instead of being set on the shared logger, so a debug override only applies to
+the request that asked for it even when other requests are running on other threads or tasks.
+
+NOTE: contextvars follow the request into sync_to_async threads; run_in_executor (see executor.py) copies the context
+    for the executor threads
+"""
+import contextvars
+import logging
+
+_override = contextvars.ContextVar('endpoint_log_override', default=None)
+
+
+class LogOverride(object):
+    """
+    The log level for the current request (None for the logger's level) and whether its logging is skipped
+    because it didn't match the endpoint's log filter field
+    """
+    def __init__(self, level=None, skip=False):
+        self.level = level
+        self.skip = skip
+
+    def __str__(self):
+        return f"level: {self.level} skip: {self.skip}"
+
+
+def get_log_override():
+    return _override.get()
+
+
+def set_log_override(level=None, skip=False):
+    _override.set(LogOverride(level, skip))
+
+
+def clear_log_override():
+    _override.set(None)
+
+
+class EndpointLogFilter(logging.Filter):
+    """
+    Applies the current request's override to the endpoint logger: records under the override level (or level when
+    the request has no override) are dropped as is everything for a request skipped by its endpoint's log filter field
+    NOTE: the endpoint logger itself is set to DEBUG in settings.LOGGING so any request can turn on debug logging; this
+        filter is what keeps every other request at level
+    """
+    def __init__(self, level='WARNING'):
+        super().__init__()
+        self.level = logging.getLevelName(level) if isinstance(level, str) else level
+
+    def is_enabled_for(self, level):
+        override = _override.get()
+        if override is not None:
+            if override.skip:
+                return False
+            if override.level:
+                return level >= override.level
+        return level >= self.level
+
+    def filter(self, record):
+        return self.is_enabled_for(record.levelno)
+
+
+class ContextLogAdapter(logging.LoggerAdapter):
+    """
+    A logger that checks the current request's override (see EndpointLogFilter) before a record is created so
+    messages for levels that won't be logged are never built
+    """
+    def __init__(self, logger):
+        super().__init__(logger, {})
+
+    def isEnabledFor(self, level):
+        if not self.logger.isEnabledFor(level):
+            return False
+        return all(log_filter.is_enabled_for(level) for log_filter in self.logger.filters
+                   if isinstance(log_filter, EndpointLogFilter))
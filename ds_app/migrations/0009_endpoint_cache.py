@@ -0,0 +1,28 @@
+# Generated by Django 3.2.14 on 2026-10-18 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ds_app', '0008_endpoint_result_format'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='endpoint',
+            name='cache_timeout',
+            field=models.PositiveIntegerField(blank=True, help_text='Seconds to cache GET results.  Empty or 0 disables caching.', null=True),
+        ),
+        migrations.AddField(
+            model_name='endpoint',
+            name='cache_vary_by_parameters',
+            field=models.BooleanField(default=True, help_text='Cache results separately for each set of parameter values.  Uncheck to cache one result for all calls.'),
+        ),
+        migrations.AddField(
+            model_name='endpoint',
+            name='cache_tables',
+            field=models.CharField(blank=True, help_text='Comma separated list of tables this endpoint reads or changes.  Running a POST, PUT or DELETE statement clears the cached GET results of every endpoint that shares one of these tables.', max_length=800, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.14 on 2026-10-18 10:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ds_app', '0009_endpoint_cache'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='endpoint',
+            name='stream_results',
+            field=models.BooleanField(default=False, help_text='Stream the results to the client as they are read from the database instead of building the whole response in memory.  Use for large result sets; streamed results are never cached.'),
+        ),
+    ]
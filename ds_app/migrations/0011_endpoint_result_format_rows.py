@@ -0,0 +1,18 @@
+# Generated by Django 3.2.14 on 2026-10-18 11:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ds_app', '0010_endpoint_stream_results'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='endpoint',
+            name='result_format',
+            field=models.CharField(blank=True, choices=[('simple', 'resultset only'), ('verbose', 'basic property information including resultsets'), ('ndjson', 'newline delimited json; one row per line'), ('csv', 'comma separated values with a header row')], help_text='Empty value will default to simple for SQL and verbose for stored procedures.  Note: specifying simple for stored procedure will only return the first resultset.  ndjson and csv are always streamed and also only return the first resultset', max_length=25, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.14 on 2026-10-18 13:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ds_app', '0012_endpoint_result_format_columnar'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='endpoint',
+            name='page_key_field_name',
+            field=models.CharField(blank=True, help_text='Unique column the results are ordered by when paging with the _limit, _offset and _after parameters.  Required for _after (keyset) paging; without it paging relies on the order by of the statement.', max_length=100, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.14 on 2026-10-18 22:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ds_app', '0013_endpoint_page_key_field_name'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='endpoint',
+            name='page_key_field_name',
+            field=models.CharField(blank=True, help_text='Unique column the results are ordered by when paging with the _limit, _offset and _after parameters.  Required for paging; requests with paging parameters are rejected without it.', max_length=100, null=True),
+        ),
+    ]
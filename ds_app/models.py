@@ -9,7 +9,10 @@ log_level_choices = (
 
 return_choices = (
     ('simple', 'resultset only'),
-    ('verbose', 'basic property information including resultsets')
+    ('verbose', 'basic property information including resultsets'),
+    ('ndjson', 'newline delimited json; one row per line'),
+    ('csv', 'comma separated values with a header row'),
+    ('columnar', 'column names once followed by each row as an array of values')
 )
 
 
@@ -35,15 +38,44 @@ class Endpoint(models.Model):
                                      help_text=(
                                          'Empty value will default to simple for SQL and verbose for stored '
                                          'procedures.  Note: specifying simple for stored procedure will only '
-                                         'return the first resultset'))
+                                         'return the first resultset.  ndjson and csv are always streamed '
+                                         'and also only return the first resultset'))
+    stream_results = models.BooleanField(default=False,
+                                         help_text=(
+                                             'Stream the results to the client as they are read from the database '
+                                             'instead of building the whole response in memory.  Use for large '
+                                             'result sets; streamed results are never cached.'))
+    page_key_field_name = models.CharField(max_length=100, null=True, blank=True,
+                                           help_text=(
+                                               'Unique column the results are ordered by when paging with the '
+                                               '_limit, _offset and _after parameters.  Required for paging; '
+                                               'requests with paging parameters are rejected without it.'))
     log_level_override = models.PositiveSmallIntegerField(choices=log_level_choices, null=True, blank=True)
     log_filter_field_name = models.CharField(max_length=100, null=True, blank=True)
     log_filter_field_value = models.CharField(max_length=100, null=True, blank=True)
+    cache_timeout = models.PositiveIntegerField(null=True, blank=True,
+                                                help_text='Seconds to cache GET results.  Empty or 0 disables caching.')
+    cache_vary_by_parameters = models.BooleanField(default=True,
+                                                   help_text='Cache results separately for each set of parameter '
+                                                             'values.  Uncheck to cache one result for all calls.')
+    cache_tables = models.CharField(max_length=800, null=True, blank=True,
+                                    help_text=(
+                                        'Comma separated list of tables this endpoint reads or changes.  Running a '
+                                        'POST, PUT or DELETE statement clears the cached GET results of every '
+                                        'endpoint that shares one of these tables.'))
     # modified_by = models.CharField(max_length=255, null=True, blank=True)
     # modified_date = models.DateTimeField(auto_now=True, editable=False)
 
     class Meta:
         ordering = ["path"]
 
+    def cache_table_list(self):
+        """
+        returns the cache_tables as a list of lowercase table names
+        """
+        if not self.cache_tables:
+            return []
+        return [table.strip().lower() for table in self.cache_tables.split(',') if table.strip()]
+
     def __str__(self):
         return self.path
@@ -0,0 +1,264 @@
+"""
+Connection pools for endpoint databases so requests reuse open connections instead of paying for a new connection
+(and TLS handshake) every time.  Configured with a POOL dict on the connection in endpoint_databases_dict.txt;
+connections without one use the normal django connection for the thread.
+
+    'reporting': {
+        'ENGINE': 'django.db.backends.mysql',
+        ...
+        'POOL': {
+            'MIN_SIZE': 2,          # connections kept open even when idle
+            'MAX_SIZE': 10,         # connections open at once (checked out + idle)
+            'TIMEOUT': 5,           # seconds to wait for a free connection before the request gets a 503
+            'MAX_IDLE': 300,        # seconds an idle connection above MIN_SIZE is kept before it is closed
+            'CHECK_AFTER': 5,       # seconds idle before a connection is pinged on checkout
+            'RETRY_AFTER': 1,       # seconds sent back in the Retry-After header on timeout
+        },
+    },
+
+NOTE: each pooled connection is its own django DatabaseWrapper shared across threads, so it is never closed by the
+    request finished signal; the pool closes it when it is idle too long or fails the health check
+NOTE: the stats are per process so they are logged by the process using the pools every
+    ENDPOINT_POOL_STATS_INTERVAL seconds (see log_pool_stats)
+"""
+import collections
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+from .limits import ConnectionBusy
+
+log = logging.getLogger("ds_app")
+_pools = {}
+_lock = threading.Lock()
+_next_stats_log = time.monotonic()
+
+
+class ConnectionPool(object):
+    """
+    A bounded pool of database wrappers for one connection alias
+    """
+    def __init__(self, alias, min_size=0, max_size=10, timeout=5, max_idle=300, check_after=5, retry_after=1):
+        self.alias = alias
+        self.min_size = min_size
+        self.max_size = max(max_size, min_size, 1)
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.check_after = check_after
+        self.retry_after = retry_after
+        # connections open (idle + checked out) and the idle ones as (wrapper, time returned); newest on the right
+        self.size = 0
+        self._idle = collections.deque()
+        self._condition = threading.Condition()
+        self.checkouts = 0
+        self.waits = 0
+        self.timeouts = 0
+        self.created = 0
+        self.closed = 0
+        self.failed_checks = 0
+
+    def create(self):
+        connection = connections.create_connection(self.alias)
+        # checked out by whatever thread handles the request
+        connection.inc_thread_sharing()
+        self.created += 1
+        return connection
+
+    def fill(self):
+        """
+        opens connections up to MIN_SIZE; failures are logged so a down database doesn't stop startup
+        """
+        while True:
+            with self._condition:
+                if self.size >= self.min_size:
+                    return
+                self.size += 1
+            connection = self.create()
+            try:
+                connection.ensure_connection()
+            except Exception as e:
+                log.warning(f"unable to open pooled connection for [{self.alias}]: {e}")
+                self.discard(connection)
+                return
+            self.release(connection)
+
+    def acquire(self):
+        """
+        returns a healthy connection; waits up to TIMEOUT for one to be returned if the pool is at MAX_SIZE
+        raises ConnectionBusy on timeout
+        """
+        deadline = time.monotonic() + self.timeout if self.timeout else None
+        connection = None
+        returned = None
+        waited = False
+        with self._condition:
+            expired = self.take_expired()
+            while True:
+                if self._idle:
+                    connection, returned = self._idle.pop()
+                    break
+                if self.size < self.max_size:
+                    self.size += 1
+                    break
+                if not waited:
+                    self.waits += 1
+                    waited = True
+                remaining = deadline - time.monotonic() if deadline else None
+                if remaining is not None and remaining <= 0:
+                    self.timeouts += 1
+                    log.warning(f"timed out waiting for a pooled connection for [{self.alias}]; {self}")
+                    raise ConnectionBusy(self.alias, self.retry_after)
+                self._condition.wait(remaining)
+            self.checkouts += 1
+        for idle_connection in expired:
+            self.close(idle_connection)
+
+        if connection is None:
+            try:
+                connection = self.create()
+            except Exception:
+                with self._condition:
+                    self.size -= 1
+                    self._condition.notify()
+                raise
+        elif connection.connection is not None and time.monotonic() - returned >= self.check_after:
+            # NOTE: is_usable pings the server; a closed wrapper just reconnects on the next cursor
+            if not connection.is_usable():
+                self.failed_checks += 1
+                log.debug(f"pooled connection for [{self.alias}] failed health check; reconnecting")
+                connection.close()
+        return connection
+
+    def release(self, connection):
+        # same cleanup django does at the end of a request for a normal connection
+        if connection.in_atomic_block:
+            # left in a transaction; not safe to hand out again
+            self.discard(connection)
+            return
+        if connection.errors_occurred:
+            if connection.connection is not None and connection.is_usable():
+                connection.errors_occurred = False
+            else:
+                connection.close()
+        with self._condition:
+            self._idle.append((connection, time.monotonic()))
+            self._condition.notify()
+
+    def discard(self, connection):
+        with self._condition:
+            self.size -= 1
+            self._condition.notify()
+        self.close(connection)
+
+    def take_expired(self):
+        """
+        removes idle connections over MIN_SIZE that have not been used for MAX_IDLE; call with the lock held and
+        close the returned connections after releasing it
+        """
+        expired = []
+        if not self.max_idle:
+            return expired
+        now = time.monotonic()
+        while self._idle and self.size > self.min_size and now - self._idle[0][1] > self.max_idle:
+            expired.append(self._idle.popleft()[0])
+            self.size -= 1
+        return expired
+
+    def close(self, connection):
+        try:
+            connection.close()
+        except Exception as e:
+            log.debug(f"error closing pooled connection for [{self.alias}]: {e}")
+        connection.dec_thread_sharing()
+        self.closed += 1
+
+    def stats(self):
+        return {
+            'size': self.size,
+            'idle': len(self._idle),
+            'in_use': self.size - len(self._idle),
+            'checkouts': self.checkouts,
+            'waits': self.waits,
+            'timeouts': self.timeouts,
+            'created': self.created,
+            'closed': self.closed,
+            'failed_checks': self.failed_checks,
+        }
+
+    def __str__(self):
+        return f"{self.alias}: {self.stats()}"
+
+
+def get_pool(alias):
+    """
+    returns the pool for the connection alias or None if the connection has no POOL
+    """
+    if alias in _pools:
+        return _pools[alias]
+    created = False
+    with _lock:
+        if alias not in _pools:
+            database = settings.DATABASES.get(alias) or {}
+            options = database.get('POOL')
+            pool = None
+            if options:
+                pool = ConnectionPool(alias,
+                                      min_size=options.get('MIN_SIZE', 0),
+                                      max_size=options.get('MAX_SIZE', 10),
+                                      timeout=options.get('TIMEOUT', 5),
+                                      max_idle=options.get('MAX_IDLE', 300),
+                                      check_after=options.get('CHECK_AFTER', 5),
+                                      retry_after=options.get('RETRY_AFTER', 1))
+                created = True
+            _pools[alias] = pool
+    pool = _pools[alias]
+    if created:
+        # NOTE: filled outside the lock so a slow (or down) database doesn't hold up every other alias; requests that
+        #   get the pool in the mean time just open their own connection up to MAX_SIZE
+        pool.fill()
+    return pool
+
+
+def get_pool_stats():
+    """
+    returns the stats of every pool created in this process by alias
+    """
+    return {alias: pool.stats() for alias, pool in list(_pools.items()) if pool is not None}
+
+
+def log_pool_stats():
+    """
+    logs the stats of every pool if ENDPOINT_POOL_STATS_INTERVAL seconds have passed since they were last logged
+    """
+    global _next_stats_log
+    interval = getattr(settings, 'ENDPOINT_POOL_STATS_INTERVAL', 300)
+    if not interval or time.monotonic() < _next_stats_log:
+        return
+    with _lock:
+        if time.monotonic() < _next_stats_log:
+            return
+        _next_stats_log = time.monotonic() + interval
+    for alias, stats in get_pool_stats().items():
+        log.info(f"connection pool [{alias}]: {stats}")
+
+
+@contextmanager
+def pooled_connection(alias):
+    """
+    yields a connection from the pool for the alias for the duration of the with block; the thread's normal django
+    connection is used if the alias is not pooled
+    """
+    pool = get_pool(alias)
+    if pool is None:
+        yield connections[alias]
+        return
+    connection = pool.acquire()
+    try:
+        yield connection
+    finally:
+        pool.release(connection)
+        log_pool_stats()
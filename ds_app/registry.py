@@ -0,0 +1,179 @@
+import asyncio
+import logging
+import threading
+import time
+import uuid
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.decorators import sync_and_async_middleware
+
+from .compiler import compile_sql
+from .models import Endpoint
+from .result_cache import get_cache
+from .utils import reload_app_urls
+
+log = logging.getLogger("ds_app")
+registry_methods = ["GET", "POST", "PUT", "DELETE"]
+REGISTRY_GENERATION_KEY = "ds:registry:generation"
+
+
+def get_registry_generation():
+    """
+    returns the shared registry generation token from the endpoint cache; replaced whenever an endpoint changes in
+    any process (see EndpointRegistry.invalidate)
+    """
+    cache = get_cache()
+    generation = cache.get(REGISTRY_GENERATION_KEY)
+    if generation is None:
+        # add only sets if missing so concurrent workers end up with the same token
+        cache.add(REGISTRY_GENERATION_KEY, uuid.uuid4().hex, None)
+        generation = cache.get(REGISTRY_GENERATION_KEY)
+    return generation
+
+
+class RegisteredEndpoint(object):
+    """
+    Holds an endpoint and its statements by http method so the request path does not need to go back to the database
+
+    NOTE: statements are compiled up front so the first request for each method doesn't pay for parsing
+    """
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.statements = {}
+        self.templates = {}
+        for method in registry_methods:
+            statement = getattr(endpoint, method.lower() + "_statement")
+            self.statements[method] = statement
+            if statement:
+                self.templates[method] = compile_sql(statement)
+
+    def statement(self, method):
+        return self.statements.get(method.upper())
+
+    def __str__(self):
+        return self.endpoint.path
+
+
+class EndpointRegistry(object):
+    """
+    In process registry of endpoints keyed by path.  Loaded along with the dynamic url patterns in urls.py and
+    cleared by the same hooks that reload the urls (admin save/delete and import).
+
+    Other processes (workers, loaddata, the shell) change endpoints too so every change also replaces a generation
+    token in the endpoint cache; get() compares it at most every ENDPOINT_REGISTRY_CHECK_SECONDS and reloads the
+    registry and urls when it changed.
+
+    NOTE: the dict is swapped out whole on load/clear so readers never need the lock
+    NOTE: with a per process cache (locmem) other processes never see the token change; use a shared backend in prod
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints = {}
+        self._generation = None
+        self._checked = 0.0
+
+    def load(self, endpoints, generation=None):
+        """
+        loads the endpoints; generation is the token read before the endpoints were queried (see urls.py)
+        """
+        loaded = {}
+        for endpoint in endpoints:
+            loaded[endpoint.path] = RegisteredEndpoint(endpoint)
+        with self._lock:
+            self._endpoints = loaded
+            if generation is not None:
+                self._generation = generation
+                self._checked = time.monotonic()
+        log.debug(f"endpoint registry loaded [{len(loaded)}] endpoints")
+
+    def clear(self):
+        with self._lock:
+            self._endpoints = {}
+
+    def invalidate(self):
+        """
+        clears this registry and replaces the shared generation so other processes reload theirs
+        """
+        get_cache().set(REGISTRY_GENERATION_KEY, uuid.uuid4().hex, None)
+        self.clear()
+
+    def is_check_due(self):
+        return time.monotonic() - self._checked >= getattr(settings, 'ENDPOINT_REGISTRY_CHECK_SECONDS', 5)
+
+    def check_generation(self):
+        """
+        reloads the registry and urls if an endpoint changed in another process since they were loaded
+        NOTE: hits the cache (and the database on reload) so only call it from sync code
+        """
+        if not self.is_check_due():
+            return
+        generation = get_registry_generation()
+        with self._lock:
+            self._checked = time.monotonic()
+            if generation == self._generation:
+                return
+            changed = self._generation is not None
+            self._generation = generation
+            if changed:
+                self._endpoints = {}
+        if changed:
+            log.info("endpoints changed in another process; reloading the endpoint registry and urls")
+            reload_app_urls()
+
+    def get(self, path):
+        """
+        returns the registered endpoint for the path; falls back to the database if not loaded yet
+        raises Endpoint.DoesNotExist if not found
+        """
+        self.check_generation()
+        registered = self._endpoints.get(path)
+        if registered is None:
+            registered = RegisteredEndpoint(Endpoint.objects.get(path=path))
+            with self._lock:
+                self._endpoints = {**self._endpoints, path: registered}
+        return registered
+
+    def get_loaded(self, path):
+        """
+        returns the registered endpoint for the path or None if not loaded; never hits the cache or the database
+        NOTE: also None when the generation check is due so the caller goes through get() (see check_generation)
+        """
+        if self.is_check_due():
+            return None
+        return self._endpoints.get(path)
+
+    def endpoints(self):
+        return list(self._endpoints.values())
+
+    def __len__(self):
+        return len(self._endpoints)
+
+
+endpoint_registry = EndpointRegistry()
+
+
+@sync_and_async_middleware
+def registry_middleware(get_response):
+    """
+    checks the registry generation before the url is resolved so endpoints added or enabled in another process are
+    routed here too (the resolver 404s those before the view ever calls get())
+    """
+    if asyncio.iscoroutinefunction(get_response):
+        async def middleware(request):
+            if endpoint_registry.is_check_due():
+                await sync_to_async(endpoint_registry.check_generation)()
+            return await get_response(request)
+    else:
+        def middleware(request):
+            endpoint_registry.check_generation()
+            return get_response(request)
+    return middleware
+
+
+# any save or delete (admin, loaddata, the shell...) tells the other processes to reload; connected in apps.py
+@receiver([post_save, post_delete], sender=Endpoint, dispatch_uid='ds_app_registry_invalidate')
+def _endpoint_changed(**kwargs):
+    endpoint_registry.invalidate()
@@ -0,0 +1,81 @@
+"""
+Caches the json response of GET endpoints using the django cache framework (see CACHES and ENDPOINT_CACHE_ALIAS in
+settings; locmem for dev and a shared backend in prod).
+
+Entries are never deleted one by one; each endpoint path has a generation token that is part of the key so evicting
+an endpoint just replaces its token and the old entries age out with their timeout.
+"""
+import hashlib
+import json
+import logging
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+
+log = logging.getLogger("ds_app")
+
+
+def get_cache():
+    return caches[getattr(settings, 'ENDPOINT_CACHE_ALIAS', 'default')]
+
+
+def _generation_key(path):
+    return "ds:generation:" + hashlib.md5(path.encode("utf-8")).hexdigest()
+
+
+def _get_generation(cache, path):
+    generation_key = _generation_key(path)
+    generation = cache.get(generation_key)
+    if generation is None:
+        # add only sets if missing so concurrent requests end up with the same token
+        cache.add(generation_key, uuid.uuid4().hex, None)
+        generation = cache.get(generation_key)
+    return generation
+
+
+def get_cache_key(endpoint, parameter_values):
+    """
+    key is based on the connection name, path, current generation and (optionally) the bound parameter values
+    NOTE: hashed since paths can be long and contain characters some cache backends don't allow in keys
+    """
+    cache = get_cache()
+    key_parts = [endpoint.connection_name or "", endpoint.path, str(_get_generation(cache, endpoint.path))]
+    if endpoint.cache_vary_by_parameters:
+        key_parts.append(json.dumps(parameter_values, default=str))
+    return "ds:result:" + hashlib.md5("|".join(key_parts).encode("utf-8")).hexdigest()
+
+
+def get_cached_response(cache_key):
+    cached = get_cache().get(cache_key)
+    if cached is None:
+        return None
+    status_code, content_type, content = cached
+    return HttpResponse(content, content_type=content_type, status=status_code)
+
+
+def set_cached_response(cache_key, response, timeout):
+    get_cache().set(cache_key, (response.status_code, response['Content-Type'], response.content), timeout)
+
+
+def evict_endpoint(path):
+    """
+    evicts all cached results for the endpoint path by replacing its generation token
+    """
+    if path:
+        get_cache().set(_generation_key(path), uuid.uuid4().hex, None)
+        log.debug(f"evicted cached results for [{path}]")
+
+
+def evict_tables(tables, registry):
+    """
+    evicts the cached results of every registered endpoint that shares one of the tables passed
+    """
+    tables = set(tables)
+    if not tables:
+        return
+    for registered in registry.endpoints():
+        endpoint = registered.endpoint
+        if endpoint.cache_timeout and tables.intersection(endpoint.cache_table_list()):
+            evict_endpoint(endpoint.path)
@@ -0,0 +1,108 @@
+"""
+Cached table metadata (columns, types, primary key and unique indexes) by connection and table.  Looked up with the
+backend's introspection for just the one table instead of listing every table or selecting from it, and kept for
+SCHEMA_CACHE_TTL seconds so validating a channel of configurations costs a few queries per table the first time and
+none after that.
+
+NOTE: missing tables are not cached so a table created after a failed validation is found on the next run
+"""
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections, DatabaseError
+
+log = logging.getLogger("ds_app")
+_schemas = {}
+_lock = threading.Lock()
+
+
+class TableSchema(object):
+    """
+    The columns of a table in order with their django field type (None if the type isn't known to django) and the
+    column lists of the primary key and unique indexes
+    """
+    def __init__(self, connection_name, table_name, columns, types, primary_key, unique):
+        self.connection_name = connection_name
+        self.table_name = table_name
+        self.columns = columns
+        self.types = types
+        self.primary_key = primary_key
+        self.unique = unique
+
+    def has_column(self, column):
+        return column in self.columns
+
+    def __str__(self):
+        return f"{self.connection_name}:{self.table_name} columns: {self.columns} primary key: {self.primary_key}"
+
+
+def get_ttl():
+    return getattr(settings, 'SCHEMA_CACHE_TTL', 300)
+
+
+def load_table_schema(connection_name, table_name):
+    """
+    reads the schema of the table from the database; returns None if the table does not exist
+    """
+    connection = connections[connection_name]
+    introspection = connection.introspection
+    try:
+        with connection.cursor() as cursor:
+            description = introspection.get_table_description(cursor, table_name)
+            if not description:
+                return None
+            constraints = introspection.get_constraints(cursor, table_name)
+    except DatabaseError as e:
+        log.debug(f"unable to read schema for [{connection_name}]:[{table_name}]: {e}")
+        return None
+    columns = [info.name for info in description]
+    types = {}
+    for info in description:
+        try:
+            types[info.name] = introspection.get_field_type(info.type_code, info)
+        except KeyError:
+            types[info.name] = None
+    primary_key = []
+    unique = []
+    for constraint in constraints.values():
+        if constraint.get('primary_key'):
+            primary_key = list(constraint['columns'])
+        elif constraint.get('unique'):
+            unique.append(list(constraint['columns']))
+    if not primary_key:
+        # NOTE: django's sqlite introspection misses lower case "primary key" in the table sql; table_info has it
+        primary_key = [info.name for info in description if getattr(info, 'pk', False)]
+    return TableSchema(connection_name, table_name, columns, types, primary_key, unique)
+
+
+def get_cached_schema(connection_name, table_name):
+    """
+    returns the schema of the table from the cache, loading it if missing or older than SCHEMA_CACHE_TTL; returns
+    None if the table does not exist
+    """
+    key = (connection_name, table_name)
+    cached = _schemas.get(key)
+    if cached is not None and cached[1] > time.monotonic():
+        return cached[0]
+    schema = load_table_schema(connection_name, table_name)
+    with _lock:
+        if schema is None:
+            _schemas.pop(key, None)
+        else:
+            _schemas[key] = (schema, time.monotonic() + get_ttl())
+    return schema
+
+
+def clear_schema_cache(connection_name=None, table_name=None):
+    """
+    drops the cached schemas for the connection and/or table (everything if neither is passed)
+    """
+    with _lock:
+        for key in list(_schemas):
+            if connection_name is not None and key[0] != connection_name:
+                continue
+            if table_name is not None and key[1] != table_name:
+                continue
+            del _schemas[key]
@@ -1,8 +1,10 @@
 import logging
+from django.conf import settings
 from django.urls import path
 from django.db.models.functions import Length
 from . import views
 from .models import Endpoint
+from .registry import endpoint_registry, get_registry_generation
 from .utils import TermColor
 from django.utils.text import slugify
 
@@ -13,6 +15,8 @@ urlpatterns = [
     # path('<path:url_path>', views.process_endpoint, name='data-endpoint'),
 ]
 
+# NOTE: generation is read before the query so a change made while loading triggers another reload
+generation = get_registry_generation()
 # lets try to load our url paths dynamically
 endpoints = list(Endpoint.objects.filter(is_disabled=False).order_by(Length('path').desc()))
 # this is probably not that efficient but issues with variable paths with this approach; trying to move all vars to end
@@ -27,8 +31,14 @@ for endpoint in endpoints:
 if var_enpoints:
     all_endpoints = all_endpoints + var_enpoints
 
+# keep the in process registry in sync with the url patterns so the views don't have to look up the endpoint again
+endpoint_registry.load(all_endpoints, generation)
+
+# the async view only helps when served under asgi (see asgi.py)
+endpoint_view = views.process_endpoint_async if getattr(settings, 'ENDPOINT_ASYNC', False) else views.process_endpoint
+
 log.info(f'{TermColor.BOLD}------- dynamically loading endpoints --------{TermColor.ENDC}')
 for endpoint in all_endpoints:
-    urlpatterns.append(path(endpoint.path, views.process_endpoint, kwargs={"endpoint_path": endpoint.path}, name='data-endpoint-' + slugify(endpoint.path)))
+    urlpatterns.append(path(endpoint.path, endpoint_view, kwargs={"endpoint_path": endpoint.path}, name='data-endpoint-' + slugify(endpoint.path)))
     log.info(f'     {endpoint.path}')
 log.info(f'{TermColor.BOLD}{TermColor.UNDERLINE}------- dynamically loading endpoints --------{TermColor.ENDC}')
@@ -9,7 +9,11 @@ from django.urls import clear_url_caches
 from django.db import connections, IntegrityError, DatabaseError
 from contextlib import redirect_stdout
 import logging
+import collections
+import tempfile
+import time
 from collections import namedtuple
+from .schema import TableSchema, get_cached_schema
 
 
 class TermColor:
@@ -45,6 +49,10 @@ class TermColor:
 class LogBuffer:
     """
     Captures all logging to a buffer; simulates the logging library methods and levels
+    NOTE: messages are kept as a list of lines (not one string added to for every message) and only the first and
+        last max_lines / 2 are kept with a marker for how many were left out between them; set LOG_BUFFER_SPILL_DIR
+        to write the whole log to a file there once lines start being left out.  Messages can be passed logging
+        style (log.debug("chunk: %s", diff)) so nothing is formatted below the level.
     """
     # constants for picking the log_level and determining if we log to console based on it
     LOG_DEBUG = logging.DEBUG
@@ -54,10 +62,10 @@ class LogBuffer:
     LOG_ALWAYS = 99
     LOG_SPACE = 999
 
-    _buffer = ""
+    _time = (None, "")
 
     def __init__(self, name: str = None, logger: logging.Logger = None, level: int = None, color_output: bool = False,
-                 echo: bool = False) -> None:
+                 echo: bool = False, max_lines: int = None, spill_dir: str = None) -> None:
         self.name = name
         self.logger = logger or logging.getLogger(name)
         if level is None:
@@ -67,48 +75,122 @@ class LogBuffer:
         self.level = self._level
         self.color_output = color_output
         self.echo = echo
+        if max_lines is None:
+            max_lines = getattr(settings, 'LOG_BUFFER_MAX_LINES', 20000)
+        self.max_lines = max_lines
+        self.spill_dir = spill_dir or getattr(settings, 'LOG_BUFFER_SPILL_DIR', None)
+        self.spill_path = None
+        self._spill_file = None
+        self._head = []
+        self._tail = collections.deque()
+        self._elided = 0
 
     # logging helper functions
-    def debug(self, msg):
-        self.log(msg, self.LOG_DEBUG)
-
-    def info(self, msg, color_output=None):
-        self.log(msg, self.LOG_INFO, color_output)
-
-    def warning(self, msg, color_output=None):
-        self.log(msg, self.LOG_WARN, color_output)
-
-    def fatal(self, msg, color_output=None):
-        self.log(msg, self.LOG_FATAL, color_output)
-
-    def always(self, msg, color_output=None):
-        self.log(msg, self.LOG_ALWAYS, color_output)
-
-    def log(self, msg, log_level, color_output=None):
-        if log_level >= self.level:
-            c_msg = str(msg)
-            color = color_output or self.color_output
-            if color:
-                if log_level == self.LOG_DEBUG:
-                    c_msg = self.format_msg(log_level, msg)
-                if log_level == self.LOG_INFO:
-                    c_msg = TermColor.OKBLUE + self.format_msg(log_level, msg) + TermColor.ENDC
-                if log_level == self.LOG_WARN:
-                    c_msg = TermColor.WARNING + self.format_msg(log_level, msg) + TermColor.ENDC
-                if log_level == self.LOG_FATAL:
-                    c_msg = TermColor.FAIL + self.format_msg(log_level, msg) + TermColor.ENDC
-                if log_level == self.LOG_ALWAYS:
-                    c_msg = TermColor.F_DarkGray + self.format_msg(log_level, msg) + TermColor.ENDC
-            self._buffer += c_msg + "\n"
-            if self.echo:
-                self.logger.log(log_level, c_msg)
+    def debug(self, msg, *args):
+        self.log(msg, self.LOG_DEBUG, *args)
+
+    def info(self, msg, *args, color_output=None):
+        self.log(msg, self.LOG_INFO, *args, color_output=color_output)
+
+    def warning(self, msg, *args, color_output=None):
+        self.log(msg, self.LOG_WARN, *args, color_output=color_output)
+
+    def fatal(self, msg, *args, color_output=None):
+        self.log(msg, self.LOG_FATAL, *args, color_output=color_output)
+
+    def always(self, msg, *args, color_output=None):
+        self.log(msg, self.LOG_ALWAYS, *args, color_output=color_output)
+
+    def is_enabled_for(self, log_level: int) -> bool:
+        return log_level >= self.level
+
+    def log(self, msg, log_level, *args, color_output=None):
+        if log_level < self.level:
+            return
+        c_msg = self.format_message(msg, args)
+        color = color_output or self.color_output
+        if color:
+            if log_level == self.LOG_DEBUG:
+                c_msg = self.format_msg(log_level, c_msg)
+            if log_level == self.LOG_INFO:
+                c_msg = TermColor.OKBLUE + self.format_msg(log_level, c_msg) + TermColor.ENDC
+            if log_level == self.LOG_WARN:
+                c_msg = TermColor.WARNING + self.format_msg(log_level, c_msg) + TermColor.ENDC
+            if log_level == self.LOG_FATAL:
+                c_msg = TermColor.FAIL + self.format_msg(log_level, c_msg) + TermColor.ENDC
+            if log_level == self.LOG_ALWAYS:
+                c_msg = TermColor.F_DarkGray + self.format_msg(log_level, c_msg) + TermColor.ENDC
+        self.append(c_msg)
+        if self.echo:
+            self.logger.log(log_level, c_msg)
+
+    @staticmethod
+    def format_message(msg, args) -> str:
+        if not args:
+            return str(msg)
+        try:
+            return str(msg) % args
+        except (TypeError, ValueError, KeyError):
+            # NOTE: a bad format string shouldn't take the sync down with it; keep the message and args as they are
+            return " ".join([str(msg)] + [str(arg) for arg in args])
+
+    def append(self, line: str) -> None:
+        if self._spill_file:
+            self._spill_file.write(line + "\n")
+        if not self.max_lines or len(self._head) < self.max_lines // 2:
+            self._head.append(line)
+            return
+        self._tail.append(line)
+        if len(self._tail) > self.max_lines - self.max_lines // 2:
+            if self._elided == 0:
+                self.spill()
+            self._tail.popleft()
+            self._elided += 1
+
+    def spill(self) -> None:
+        """
+        starts writing the whole log to a file in spill_dir (if set) since lines are about to be left out
+        """
+        if not self.spill_dir or self._spill_file:
+            return
+        try:
+            self._spill_file = tempfile.NamedTemporaryFile(mode='w', dir=self.spill_dir, suffix='.log', delete=False,
+                                                           prefix=f"{self.name or 'log'}-")
+        except OSError as e:
+            self.logger.warning(f"unable to spill log to [{self.spill_dir}]: {e}")
+            return
+        self.spill_path = self._spill_file.name
+        self._spill_file.writelines(line + "\n" for line in self._head)
+        self._spill_file.writelines(line + "\n" for line in self._tail)
+
+    def close(self) -> None:
+        """
+        closes the spill file (if any) once the log has been saved; the lines kept in memory are still there
+        """
+        if self._spill_file:
+            self._spill_file.close()
+            self._spill_file = None
 
     def clear(self) -> None:
-        self._buffer = ""
+        self._head = []
+        self._tail = collections.deque()
+        self._elided = 0
+        self.close()
+        self.spill_path = None
         self.level = self._level
 
     def __str__(self):
-        return self._buffer
+        lines = self._head
+        if self._elided:
+            marker = f"... [{self._elided}] lines elided"
+            if self._spill_file:
+                self._spill_file.flush()
+            if self.spill_path:
+                marker += f"; full log in [{self.spill_path}]"
+            lines = lines + [marker + " ..."]
+        if self._tail:
+            lines = lines + list(self._tail)
+        return "".join(line + "\n" for line in lines)
 
     def format_msg(self, log_level: int, c_msg: str) -> str:
         # later may add formatting separately like logging but static for now
@@ -131,9 +213,13 @@ class LogBuffer:
             return "TRACE".ljust(5)
         return "".ljust(5)
 
-    @staticmethod
-    def get_time() -> str:
-        return f'{datetime.datetime.now():%Y-%m-%d %H:%M:%S%z}'
+    @classmethod
+    def get_time(cls) -> str:
+        # NOTE: the format only changes once a second so reuse it rather than formatting for every line
+        second = int(time.time())
+        if cls._time[0] != second:
+            cls._time = (second, f'{datetime.datetime.now():%Y-%m-%d %H:%M:%S%z}')
+        return cls._time[1]
 
 
 # class ColorLogger:
@@ -296,6 +382,26 @@ def dictfetchstoredresults(cursor):
     return resultsets
 
 
+def columnarfetchstoredresults(cursor):
+    """
+    columnarfetchstoredresults will return all resultsets in the columnar format named the same as
+    dictfetchstoredresults
+    format: [{rs0: {columns: [...], rows: [[...], ...]}}, {rs1:...}]
+    """
+    resultsets = []
+    result = columnarfetchall(cursor)
+    i = 0
+    if result['rows']:
+        resultsets.append({'rs' + str(i): result})
+    while cursor.nextset():
+        result = columnarfetchall(cursor)
+        if result['rows']:
+            i += 1
+            resultsets.append({'rs' + str(i): result})
+
+    return resultsets
+
+
 def dictfetchstoredparameters(cursor, callable_name, callable_args):
     """
     dictfetchstoredparams will return all param values as a dictionary for inclusion in the
@@ -318,6 +424,21 @@ def dictfetchstoredparameters(cursor, callable_name, callable_args):
     return result_args_dict
 
 
+def convert_byte_fields(row, types):
+    """
+    convert any mysql "byte" type (16) values in the row to integers
+    """
+    new_row = []
+    i = 0
+    for field_value in row:
+        if types[i] == 16:
+            new_row.append(int.from_bytes(field_value, "big"))
+        else:
+            new_row.append(field_value)
+        i = i + 1
+    return new_row
+
+
 def dictfetchall(cursor):
     """Return all rows from a cursor as a dict"""
     # NOTE: this has been modified to convert if results contains mysql "byte" type!
@@ -331,13 +452,7 @@ def dictfetchall(cursor):
             new_row = []
             # ensure each row that is a byte type is converted to integer?
             if convert:
-                i = 0
-                for field_value in row:
-                    if types[i] == 16:
-                        new_row.append(int.from_bytes(field_value, "big"))
-                    else:
-                        new_row.append(field_value)
-                    i = i + 1
+                new_row = convert_byte_fields(row, types)
             if new_row:
                 rows.append(dict(zip(columns, new_row)))
             else:
@@ -345,6 +460,49 @@ def dictfetchall(cursor):
     return rows
 
 
+def columnarfetchall(cursor):
+    """
+    Return all rows from a cursor as the column names once and each row as a list of values; no dict per row
+    format: {columns: [col1, col2...], rows: [[value1, value2...], ...]}
+    """
+    columns = []
+    rows = []
+    meta = cursor.description
+    if meta:
+        columns = [col[0] for col in meta]
+        types = [col[1] for col in meta]
+        rows = cursor.fetchall()
+        # NOTE: same as dictfetchall we need to convert if results contains mysql "byte" type!
+        if 16 in types:
+            rows = [convert_byte_fields(row, types) for row in rows]
+    return {'columns': columns, 'rows': rows}
+
+
+def iterfetchmany(cursor, chunk_size=1000):
+    """
+    Yield rows from a cursor in lists of up to chunk_size rows using fetchmany so the whole result is never in memory
+    NOTE: rows are converted the same as dictfetchall if results contain mysql "byte" type
+    """
+    meta = cursor.description
+    if meta:
+        types = [col[1] for col in meta]
+        convert = 16 in types
+        rows = cursor.fetchmany(chunk_size)
+        while rows:
+            if convert:
+                rows = [convert_byte_fields(row, types) for row in rows]
+            yield rows
+            rows = cursor.fetchmany(chunk_size)
+
+
+class EchoBuffer:
+    """
+    File like object that just returns what is written; lets csv.writer format a row into a string for streaming
+    """
+    def write(self, value):
+        return value
+
+
 def dictfetchall_original(cursor):
     """Return all rows from a cursor as a dict"""
     # NOTE: this is the original code that does not work with mysql "byte" type!
@@ -415,17 +573,14 @@ class Capture(redirect_stdout):
 
 
 def table_exists(table_name: str, connection_name: str) -> bool:
-    return table_name in connections[connection_name].introspection.table_names()
+    # NOTE: checks just the one table (see schema.py) rather than listing every table on the connection
+    return get_cached_schema(connection_name, table_name) is not None
 
 
-def get_table_schema(table_name: str, connection_name: str) -> dict:
-    schema = {}
-    if not table_exists(table_name, connection_name):
+def get_table_schema(table_name: str, connection_name: str) -> TableSchema:
+    schema = get_cached_schema(connection_name, table_name)
+    if schema is None:
         raise IntegrityError(f"Table [{table_name}] does not exist!")
-
-    connection = connections[connection_name]
-    with connection.cursor() as cursor:
-        table_info = connection.introspection.get_table_list(cursor)
     return schema
 
 
@@ -7,36 +7,60 @@
 #   about mid way down the page for usage differences.
 #
 from django.db.utils import ConnectionDoesNotExist, OperationalError
-from django.http import Http404, JsonResponse, HttpResponseBadRequest
+from django.http import Http404, JsonResponse, HttpResponse, HttpResponseBadRequest, StreamingHttpResponse
+from django.core.serializers.json import DjangoJSONEncoder
 from django.views.decorators.csrf import csrf_exempt
 from django.db import connections
 from django.conf import settings
+from asgiref.sync import sync_to_async
+import csv
+import itertools
 import logging
-import re
 import json
 
+from .compiler import compile_sql
+from .executor import run_in_executor
+from .log_context import ContextLogAdapter, clear_log_override, set_log_override
+from .limits import ConnectionBusy, connection_slot, get_limiter, holding_slot, is_slot_held
+from .pool import get_pool, log_pool_stats, pooled_connection
 from .models import Endpoint
-from .utils import TermColor, dictfetchall, dictfetchstoredresults, dictfetchstoredparameters
-from .utils import get_key_by_idx, get_tuple_in_list, to_bool, to_int
+from .registry import endpoint_registry
+from .result_cache import get_cache_key, get_cached_response, set_cached_response, evict_tables
+from .utils import TermColor, dictfetchall, dictfetchstoredresults, dictfetchstoredparameters, iterfetchmany
+from .utils import columnarfetchall, columnarfetchstoredresults
+from .utils import get_tuple_in_list, to_bool, to_int, EchoBuffer
 
 # todo: figure out how to handle types if needed (<section_id:int>)
-log = logging.getLogger("endpoint")
+# NOTE: endpoint log level overrides are per request (see log_context.py); never call setLevel on this logger
+log = ContextLogAdapter(logging.getLogger("endpoint"))
 valid_methods = ["GET", "POST", "PUT", "DELETE"]
+# result formats written a row at a time straight from the cursor (always streamed) and their content types
+row_formats = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+# reserved request parameters used for paging select statements; never passed to the sql as parameters
+page_parameter_names = ["_limit", "_offset", "_after"]
+# page size used when ENDPOINT_PAGE_MAX_LIMIT is not set
+DEFAULT_PAGE_MAX_LIMIT = 10000
 
 
 class SqlParameter(object):
     """
     Instead of just the arg name we need the position to know for optional arguments
     """
-    def __init__(self, name, value=None, positions=(-1, -1), ordinal=False, group=None):
+    def __init__(self, name, value=None, positions=(-1, -1), ordinal=False, group=None, cast_to=None):
         self.group = group
         self.name = name
         self.start = positions[0]
         self.end = positions[1]
         self.ordinal = ordinal
-        self.cast_to = None
+        self.cast_to = cast_to
         self.__value = value
-        if ordinal:
+        if cast_to is not None:
+            # already parsed by the compiler
+            pass
+        elif ordinal:
             if group:
                 # if we have a group (we should) parse the pipes if found to determine the cast_to
                 # look for a |<cast char>| and perform casting on value
@@ -85,21 +109,114 @@ class MethodParameters(object):
                 self.endpoint_path = value
             else:
                 self.parameters[arg] = value
+        self.page_parameters = {}
         for key, value in param_list:
             # print(f'param -> key: {key} value: {value}')
-            self.parameters[key] = value
+            if key in page_parameter_names:
+                self.page_parameters[key] = value
+            else:
+                self.parameters[key] = value
 
     def __str__(self):
         return f'parameters: {self.parameters}'
 
 
+class PageRequest(object):
+    """
+    Encapsulates the paging requested with the reserved _limit, _offset and _after parameters and the state needed
+    to describe the next page after the rows are read
+    """
+    def __init__(self, page_parameters, key_field_name=None, max_limit=None):
+        self.key_field_name = key_field_name
+        self.errors = []
+        max_limit = max_limit or DEFAULT_PAGE_MAX_LIMIT
+        self.limit = self.get_int(page_parameters, "_limit", minimum=1)
+        self.offset = self.get_int(page_parameters, "_offset")
+        self.after = page_parameters.get("_after")
+        if self.limit is None or self.limit > max_limit:
+            self.limit = max_limit
+        # NOTE: pages are only stable when ordered by a unique key; the order by of the statement itself isn't kept
+        #   once it is wrapped (mysql drops it from a derived table)
+        if not key_field_name:
+            self.errors.append("Paging ([_limit], [_offset] or [_after]) requires a page key field on the endpoint\n")
+        self.has_more = False
+        self.returned = 0
+        self.last_key = None
+
+    def get_int(self, page_parameters, name, minimum=0):
+        value = page_parameters.get(name)
+        if value is None or value == "":
+            return None
+        error = f"Parameter [{name}] must be a {'positive' if minimum else 'non-negative'} integer\n"
+        try:
+            value = to_int(value, raise_exception=True)
+        except (TypeError, ValueError):
+            self.errors.append(error)
+            return None
+        if value < minimum:
+            self.errors.append(error)
+            return None
+        return value
+
+    def take(self, rows, key=None):
+        """
+        trims the extra row we fetch to know if there is another page and remembers the last key for the next page
+        NOTE: key is the column name for dict rows or the column index for tuple/list rows
+        """
+        if len(rows) > self.limit:
+            self.has_more = True
+            rows = rows[:self.limit]
+        self.returned += len(rows)
+        if rows and key is not None:
+            self.last_key = rows[-1][key]
+        return rows
+
+    def iter_chunks(self, chunks, key=None):
+        """
+        same as take for chunks of rows being streamed
+        """
+        for rows in chunks:
+            if self.returned >= self.limit:
+                self.has_more = True
+                break
+            if self.returned + len(rows) > self.limit:
+                self.has_more = True
+                rows = rows[:self.limit - self.returned]
+            self.returned += len(rows)
+            if rows and key is not None:
+                self.last_key = rows[-1][key]
+            yield rows
+
+    def key_index(self, cursor):
+        if self.key_field_name and cursor.description:
+            columns = [col[0] for col in cursor.description]
+            if self.key_field_name in columns:
+                return columns.index(self.key_field_name)
+        return None
+
+    def metadata(self):
+        """
+        returns the next page information for verbose results
+        """
+        page = {"limit": self.limit, "offset": self.offset, "after": self.after, "has_more": self.has_more}
+        if self.after is None:
+            page["next_offset"] = (self.offset or 0) + self.returned if self.has_more else None
+        if self.key_field_name:
+            page["next_after"] = self.last_key if self.has_more else None
+        return page
+
+
 class ParsedSql(object):
     """
     Encapsulates the state after parsing the sql
+
+    NOTE: the parsing is done once per statement text by the compiler (see compiler.py); here we only bind the
+        passed values and choose which optional blocks to keep
     """
     def __init__(self, sql, method_parameters):
-        self.original_sql = sql
-        self.uncommented_sql = self.strip_comments()
+        self.template = compile_sql(sql)
+        self.original_sql = self.template.original_sql
+        self.uncommented_sql = self.template.uncommented_sql
         self.params = []
         self._callable = False
         self.callable_name = ""
@@ -109,134 +226,42 @@ class ParsedSql(object):
 
     def parse(self, method_parameters):
         """
-        parses the original sql doing string replacements and building argument lists
+        binds the passed parameters to the compiled template building argument lists
         """
-        sql = self.uncommented_sql
-        # check for ? (ordinal) and add named arguments by index then just string replace
-        sql = self.parse_ordinal_args(sql, method_parameters)
-        # check for named parameters and add named arguments while doing string replacements
-        sql = self.parse_named_args(sql)
-        # next check for optional text and strip if we don't have a param
-        sql = self.strip_optional_args(sql, method_parameters)
+        passed_parameters = method_parameters.parameters
+        slot_names = self.template.slot_names(list(passed_parameters))
+        # strip optional text if we don't have a param
+        rendered = self.template.render(self.template.missing_blocks(slot_names, passed_parameters))
+        for idx, slot in enumerate(self.template.slots):
+            if idx in rendered.removed_slot_indexes:
+                continue
+            self.params.append(SqlParameter(slot_names[idx], positions=(slot.start, slot.end), ordinal=slot.ordinal,
+                                            cast_to=slot.cast_to))
         # last set our values for our arguments by looking them up from passed parameters
         for param in self.params:
             try:
-                param.value = method_parameters.parameters[param.name]
-                # self.values.append(method_parameters.parameters[param])
+                param.value = passed_parameters[param.name]
             except KeyError:
                 self.init_errors.append(f"Missing required parameter [{param}]\n")
         # if this is a callable procedure since called differently
         # mysqlclient uses the procedure name and a list of args in callproc method
-        self.parse_callproc(sql)
-        return sql
-
-    def strip_comments(self):
-        sql = ""
-        lines = self.original_sql.split('\n')
-        for line in lines:
-            if line.strip().startswith("--"):
-                continue
-            sql += line + '\n'
-        return sql
-
-    def parse_ordinal_args(self, sql, params):
-        pattern = re.compile(r'(\?(\|.\|)?)')
-        new_sql = ""
-        last_match = 0
-        ordinal_index = 0
-        for match in re.finditer(pattern, sql):
-            # print(match.group(1))
-            try:
-                key = get_key_by_idx(params.parameters, ordinal_index)
-                param = SqlParameter(key, positions=match.span(), ordinal=True, group=match.group(1))
-            except IndexError:
-                param = SqlParameter(f"p{ordinal_index}", positions=match.span(), ordinal=True, group=match.group(1))
-            self.params.append(param)
-            ordinal_index += 1
-            new_sql += sql[last_match:match.start()]
-            new_sql += '%s'
-            last_match = match.end()
-        new_sql += sql[last_match:]
-        # print(f'parsed sql: {new_sql}')
-        return new_sql
-
-    def parse_named_args(self, sql):
-        # pattern = re.compile(r'<(.+)>')
-        # pattern was too greedy and caught everything; trying to exclude >
-        # pattern = re.compile(r'<([^>]+)>')
-        # pattern still too greedy; catching = and >= or < <= in where clause
-        # NOTE: (?!) is a negative lookahead; [\s]|[=] makes it not match if whitespace or equals
-        pattern = re.compile(r'<(?![\s]|[=])([^>]+)>')
-        new_sql = ""
-        last_match = 0
-        for match in re.finditer(pattern, sql):
-            # print(match.group(1))
-            self.params.append(SqlParameter(match.group(1), positions=match.span(), group=match.group(1)))
-            new_sql += sql[last_match:match.start()]
-            new_sql += '%s'
-            last_match = match.end()
-        new_sql += sql[last_match:]
-        # print(f'parsed sql: {new_sql}')
-        return new_sql
-
-    def strip_optional_args(self, sql, passed_parameters):
-        """
-        strip optional args not supporting multiple strips; need to loop and change the search for the ending ]]
-
-        NOTE: uncommented sql is needed because it has the param names still; sql has had them replaced with values
-        """
-        us = self.uncommented_sql
-        us_pos_start = us.find('[[')
-        us_pos_end = us.find(']]', us_pos_start) if us_pos_start > -1 else -1
-        s = sql
-        s_pos_start = s.find('[[')
-        s_pos_end = s.find(']]', s_pos_start) if s_pos_start > -1 else -1
-
-        while us_pos_start > -1 and us_pos_end > -1 and s_pos_start > -1 and s_pos_end > -1:
-            missing = False
-            for param in self.params:
-                if param.start >= us_pos_start and param.end <= us_pos_end:
-                    if param.name not in passed_parameters.parameters:
-                        missing = True
-                    break
-            if missing:
-                # remove any parameters within range (otherwise we will get the param not passed error)
-                for param in reversed(self.params):
-                    if param.start >= us_pos_start and param.end <= us_pos_end:
-                        self.params.remove(param)
-                # strip the whole block from the sql
-                s = s[0:s_pos_start] + s[s_pos_end + 2:]
-            else:
-                # strip only the open/close bracket tag
-                s = s[0:s_pos_start] + s[s_pos_start + 2:s_pos_end] + s[s_pos_end + 2:]
-            # look for other block positions
-            us_pos_start = us.find('[[', us_pos_end)
-            us_pos_end = us.find(']]', us_pos_start) if us_pos_start > -1 else -1
-            s_pos_start = s.find('[[', s_pos_end)
-            s_pos_end = s.find(']]', s_pos_start) if s_pos_start > -1 else -1
-        return s
-
-    def parse_callproc(self, sql):
-        upper_sql = sql.upper()
-        pos = upper_sql.find("CALL ")
-        if pos > -1:
-            pos += len("CALL ")
-            pos_argstart = upper_sql.find("(", pos)
-            pos_argend = upper_sql.rfind(")", pos)
-            if pos > -1 and pos_argstart > -1 and pos_argend > -1:
-                self._callable = True
-                self.callable_name = sql[pos:pos_argstart].strip()
-                self.callable_args = sql[pos_argstart + 1: pos_argend].lower().split(",")
-                # substitute any callable args '%s' with the next value
-                value_idx = 0
-                for arg_idx in range(len(self.callable_args)):
-                    # if self.callable_args[arg_idx] and self.callable_args[arg_idx].strip().startswith("%s"):
-                    if self.callable_args[arg_idx] and self.callable_args[arg_idx].strip() == "%s":
-                        if len(self.params) > arg_idx:
-                            self.callable_args[arg_idx] = self.params[value_idx].value
-                            value_idx += 1
-            log.debug(f"callable_name:\n{self.callable_name}")
-            log.debug(f"callable_args:\n{self.callable_args}")
+        self.parse_callproc(rendered)
+        return rendered.statement
+
+    def parse_callproc(self, rendered):
+        if rendered.callable:
+            self._callable = True
+            self.callable_name = rendered.callable_name
+            self.callable_args = list(rendered.callable_args)
+            # substitute any callable args '%s' with the next value
+            value_idx = 0
+            for arg_idx in rendered.callable_value_indexes:
+                if len(self.params) > arg_idx:
+                    self.callable_args[arg_idx] = self.params[value_idx].value
+                    value_idx += 1
+        if rendered.has_call:
+            log.debug("callable_name:\n%s", self.callable_name)
+            log.debug("callable_args:\n%s", self.callable_args)
 
     def is_update(self):
         pos_update = self.statement.lower().find("update")
@@ -271,16 +296,62 @@ class ParsedSql(object):
     def parameter_dict(self):
         """
         returns the sql parameter values in a dict for use in verbose result output
+        NOTE: paging parameters are described in the page property instead
         """
         value_dict = {}
         for param in self.params:
+            if param.name in page_parameter_names:
+                continue
             value_dict[param.name] = str(param.value)
         return value_dict
 
+    def is_select(self):
+        return self.statement.lstrip().lstrip("(").lower().startswith(("select", "with"))
+
+    def paginate(self, page):
+        """
+        wraps a select statement so it only returns the requested page; we fetch one more row than the limit to know
+        if there is another page
+        """
+        if self.is_callable() or not self.is_select():
+            self.init_errors.append("Paging parameters are only supported for select statements\n")
+            return
+        statement = self.statement.strip().rstrip(";")
+        sql = f"SELECT * FROM ({statement}) ds_page"
+        if page.after is not None:
+            sql += f" WHERE {page.key_field_name} > %s"
+            self.params.append(SqlParameter("_after", value=page.after))
+        sql += f" ORDER BY {page.key_field_name} LIMIT %s"
+        self.params.append(SqlParameter("_limit", value=page.limit + 1))
+        if page.offset:
+            sql += " OFFSET %s"
+            self.params.append(SqlParameter("_offset", value=page.offset))
+        self.statement = sql
+
     def __str__(self):
         return self.statement
 
 
+class ClosingIterator(object):
+    """
+    Wraps the streamed content so closing the response calls close even if the generator was never started (closing
+    an unstarted generator skips its finally)
+    """
+    def __init__(self, iterable, close):
+        self.iterator = iter(iterable)
+        self._close = close
+
+    def __iter__(self):
+        return self.iterator
+
+    def close(self):
+        try:
+            if hasattr(self.iterator, 'close'):
+                self.iterator.close()
+        finally:
+            self._close()
+
+
 class ExecutableStatement(object):
     """
     Encapsulates the data and logic for exectuing a statement saved in the database and caching the results
@@ -296,10 +367,32 @@ class ExecutableStatement(object):
         self.updated_recs = 0
         self.results = []
         self.wrappered_results = {}
+        self.error = None
+        self.cursor = None
+        self.connection = None
+        self.pool = None
+        self.limiter = None
+        self.page = None
+
+    def paginate(self, key_field_name=None):
+        """
+        applies the paging parameters (_limit, _offset, _after) if any were passed
+        """
+        if not self.method_parameters.page_parameters:
+            return
+        self.page = PageRequest(self.method_parameters.page_parameters, key_field_name,
+                                getattr(settings, 'ENDPOINT_PAGE_MAX_LIMIT', 10000))
+        if self.page.errors:
+            self.sql.init_errors += self.page.errors
+        else:
+            self.sql.paginate(self.page)
 
-    def execute(self):
+    def execute(self, response_format=None):
         # log.debug(f'trying to open connection [{self.connection_name}]')
-        with connections[self.connection_name].cursor() as cursor:
+        # columnar results are built from the row tuples instead of a dict per row
+        columnar = response_format == "columnar"
+        with connection_slot(self.connection_name), pooled_connection(self.connection_name) as connection, \
+                connection.cursor() as cursor:
             # NOTE: I am not sure why I wrappered everything for this error, however
             #   it prevents SQL Errors from showing so I need to raise it for now;
             #   maybe for callable statement?  test this out for both params and results
@@ -309,7 +402,10 @@ class ExecutableStatement(object):
                     cursor.callproc(self.sql.callable_name, self.sql.callable_args)
                     self.updated_recs = cursor.rowcount
                     self.wrappered_results['updated'] = self.updated_recs
-                    self.results = dictfetchstoredresults(cursor)
+                    if columnar:
+                        self.results = columnarfetchstoredresults(cursor)
+                    else:
+                        self.results = dictfetchstoredresults(cursor)
                     self.wrappered_results['resultsets'] = self.results
                     # sas 2022-08-08 - moving last since we call another cursor which wipes previous results
                     self.wrappered_results['parameters'] = dictfetchstoredparameters(cursor, self.sql.callable_name, self.sql.callable_args)
@@ -325,17 +421,176 @@ class ExecutableStatement(object):
                         cursor.execute(self.sql.statement, self.sql.parameter_values())
                     else:
                         cursor.execute(self.sql.statement)
-                    self.results = dictfetchall(cursor)
+                    if columnar:
+                        self.results = columnarfetchall(cursor)
+                        if self.page:
+                            self.results['rows'] = self.page.take(self.results['rows'], self.page.key_index(cursor))
+                    else:
+                        self.results = dictfetchall(cursor)
+                        if self.page:
+                            self.results = self.page.take(self.results, self.page.key_field_name)
                     self.updated_recs = cursor.rowcount
                     self.wrappered_results['updated'] = self.updated_recs
                     self.wrappered_results['resultsets'] = {'rs0': self.results}
                     self.wrappered_results['parameters'] = self.sql.parameter_dict()
+                    if self.page:
+                        self.wrappered_results['page'] = self.page.metadata()
 
             except OperationalError as oe:
                 log.debug(oe)
+                self.error = oe
                 if settings.DEBUG:
                     raise oe
 
+    def can_stream(self):
+        # update statements only return the updated count so there is nothing to stream
+        return self.sql.is_callable() or not self.sql.is_update()
+
+    def execute_streaming(self):
+        """
+        executes the statement but leaves the cursor open so get_streaming_response can read the rows in chunks
+        NOTE: the cursor is closed (and the connection slot given back) once the response has been written
+        """
+        self.wrappered_results['cs'] = 'true'
+        limiter = get_limiter(self.connection_name)
+        if limiter is not None and not is_slot_held(self.connection_name):
+            limiter.acquire()
+            self.limiter = limiter
+        try:
+            self.pool = get_pool(self.connection_name)
+            if self.pool is not None:
+                self.connection = self.pool.acquire()
+            else:
+                self.connection = connections[self.connection_name]
+            self.cursor = self.connection.cursor()
+            if self.sql.is_callable():
+                self.cursor.callproc(self.sql.callable_name, self.sql.callable_args)
+            elif self.sql.params:
+                self.cursor.execute(self.sql.statement, self.sql.parameter_values())
+            else:
+                self.cursor.execute(self.sql.statement)
+            self.updated_recs = self.cursor.rowcount
+        except OperationalError as oe:
+            self.close_cursor()
+            log.debug(oe)
+            self.error = oe
+            if settings.DEBUG:
+                raise oe
+        except Exception:
+            self.close_cursor()
+            raise
+
+    def close_cursor(self):
+        """
+        closes the streaming cursor and returns the connection (and slot); safe to call more than once
+        """
+        if self.cursor is not None:
+            self.cursor.close()
+            self.cursor = None
+        if self.pool is not None and self.connection is not None:
+            self.pool.release(self.connection)
+            log_pool_stats()
+        self.connection = None
+        if self.limiter is not None:
+            self.limiter.release()
+            self.limiter = None
+
+    def get_streaming_response(self, response_format):
+        if response_format in row_formats:
+            if self.cursor is None:
+                return HttpResponse("", content_type=row_formats[response_format])
+            return StreamingHttpResponse(ClosingIterator(self.iter_rows(response_format), self.close_cursor),
+                                         content_type=row_formats[response_format])
+        elif self.cursor is None:
+            # the statement failed so fall back to the normal (empty) response
+            return self.get_json_response(response_format)
+        return StreamingHttpResponse(ClosingIterator(self.iter_json(response_format), self.close_cursor),
+                                     content_type='application/json')
+
+    def iter_rows(self, response_format):
+        """
+        yields the first resultset one row at a time as ndjson or csv; statements without results yield the updated
+        count instead
+        """
+        cursor = self.cursor
+        chunk_size = getattr(settings, 'ENDPOINT_STREAM_CHUNK_SIZE', 1000)
+        try:
+            if cursor.description:
+                chunks = self.iter_chunks(cursor, chunk_size)
+            else:
+                chunks = [[[self.updated_recs]]]
+            if response_format == "csv":
+                yield from itercsvrows(cursor, chunks)
+            else:
+                yield from iterndjsonrows(cursor, chunks)
+        finally:
+            self.close_cursor()
+
+    def iter_json(self, response_format):
+        """
+        yields the same json as get_json_response but reads and writes the rows a chunk at a time
+        """
+        cursor = self.cursor
+        chunk_size = getattr(settings, 'ENDPOINT_STREAM_CHUNK_SIZE', 1000)
+        encoder = DjangoJSONEncoder()
+        try:
+            if self.sql.is_callable():
+                if not response_format:
+                    response_format = "verbose"
+                if response_format in ["verbose", "columnar"]:
+                    row_writer = itercolumnarrows if response_format == "columnar" else iterjsonrows
+                    yield f'{{"cs": "true", "updated": {encoder.encode(self.updated_recs)}, "resultsets": ['
+                    yield from self.iter_json_resultsets(cursor, chunk_size, row_writer)
+                    parameters = dictfetchstoredparameters(cursor, self.sql.callable_name, self.sql.callable_args)
+                    yield f'], "parameters": {encoder.encode(parameters)}}}'
+                else:
+                    # simple only returns the first resultset
+                    yield from iterjsonrows(cursor, iterfetchmany(cursor, chunk_size))
+            else:
+                if response_format == "verbose":
+                    yield f'{{"cs": "true", "updated": {encoder.encode(self.updated_recs)}, "resultsets": {{"rs0": '
+                    yield from iterjsonrows(cursor, self.iter_chunks(cursor, chunk_size))
+                    yield f'}}, "parameters": {encoder.encode(self.sql.parameter_dict())}'
+                    if self.page:
+                        yield f', "page": {encoder.encode(self.page.metadata())}'
+                    yield '}'
+                elif response_format == "columnar":
+                    yield from itercolumnarrows(cursor, self.iter_chunks(cursor, chunk_size))
+                else:
+                    yield from iterjsonrows(cursor, self.iter_chunks(cursor, chunk_size))
+        finally:
+            self.close_cursor()
+
+    def iter_chunks(self, cursor, chunk_size):
+        # trims the rows to the requested page if paging
+        chunks = iterfetchmany(cursor, chunk_size)
+        if self.page:
+            return self.page.iter_chunks(chunks, self.page.key_index(cursor))
+        return chunks
+
+    @staticmethod
+    def iter_json_resultsets(cursor, chunk_size, row_writer=None):
+        """
+        yields each resultset the same as dictfetchstoredresults names them; empty resultsets are skipped
+        """
+        row_writer = row_writer or iterjsonrows
+        i = 0
+        written = 0
+        first_resultset = True
+        while True:
+            chunks = iterfetchmany(cursor, chunk_size)
+            rows = next(chunks, None)
+            if rows:
+                if not first_resultset:
+                    i += 1
+                yield f'{", " if written else ""}{{"rs{i}": '
+                yield from row_writer(cursor, itertools.chain([rows], chunks))
+                yield '}'
+                written += 1
+            first_resultset = False
+            if not cursor.nextset():
+                break
+
     def get_json_response(self, response_format):
         # return the wrappered_results or results based on response_format
         if self.sql.is_callable():
@@ -343,7 +598,8 @@ class ExecutableStatement(object):
             #   multiple results
             if not response_format:
                 response_format = "verbose"
-            if response_format == "verbose":
+            # columnar uses the verbose wrapper with each resultset in the columnar format
+            if response_format in ["verbose", "columnar"]:
                 return JsonResponse(self.wrappered_results, safe=False)
             else:
                 return JsonResponse(self.results, safe=False)
@@ -352,6 +608,10 @@ class ExecutableStatement(object):
             # NOTE: change this if we add new types to support other logic like above
             if response_format == "verbose":
                 return JsonResponse(self.wrappered_results, safe=False)
+            elif response_format == "columnar":
+                if self.sql.is_update():
+                    return JsonResponse({'columns': ['updated'], 'rows': [[self.updated_recs]]})
+                return JsonResponse(self.results, safe=False)
             else:
                 if self.sql.is_update():
                     return JsonResponse(f'{{"updated":{self.updated_recs}}}')
@@ -359,123 +619,311 @@ class ExecutableStatement(object):
                     return JsonResponse(self.results, safe=False)
 
 
-@csrf_exempt
-def process_endpoint(request, *args, **kwargs):
+def iterjsonrows(cursor, chunks):
     """
-    Processes the endpoint and returns the results if there is a match in urls.py
+    yields a json array of row dicts (same as JsonResponse would encode them) one chunk of rows at a time
+    """
+    columns = [col[0] for col in cursor.description] if cursor.description else []
+    encoder = DjangoJSONEncoder()
+    separator = ""
+    yield "["
+    for rows in chunks:
+        yield separator + ", ".join(encoder.encode(dict(zip(columns, row))) for row in rows)
+        separator = ", "
+    yield "]"
 
-    :param request: the request object
-    :param args: any non named arguments passed to the request
-    :param kwargs: any keyword arguments passed to the request
-    :return: json response or raised exception
+
+def itercolumnarrows(cursor, chunks):
     """
-    original_log_level = log.level
-    _endpoint_path = kwargs.get("endpoint_path")
-    _connection_name = ""
-    try:
-        endpoint = Endpoint.objects.get(path=_endpoint_path)
-        if endpoint.is_disabled:
-            raise Http404("API disabled")
+    yields the columnar format (same as columnarfetchall) one chunk of rows at a time
+    """
+    columns = [col[0] for col in cursor.description] if cursor.description else []
+    encoder = DjangoJSONEncoder()
+    separator = ""
+    yield f'{{"columns": {encoder.encode(columns)}, "rows": ['
+    for rows in chunks:
+        yield separator + ", ".join(encoder.encode(row) for row in rows)
+        separator = ", "
+    yield "]}"
+
+
+def row_columns(cursor):
+    # statements without results (updates) only return the updated count
+    if cursor.description:
+        return [col[0] for col in cursor.description]
+    return ["updated"]
+
+
+def iterndjsonrows(cursor, chunks):
+    """
+    yields each row as a json object on its own line; encoded straight from the row tuples without building dicts
+    """
+    encoder = DjangoJSONEncoder()
+    keys = [encoder.encode(column) + ": " for column in row_columns(cursor)]
+    for rows in chunks:
+        yield "".join(
+            "{" + ", ".join(key + encoder.encode(value) for key, value in zip(keys, row)) + "}\n"
+            for row in rows
+        )
 
-        # we have our endpoint and not disabled so lets execute our query and return the results as json
-        _connection_name = endpoint.connection_name or ""
-        _connection_name = _connection_name.strip()
-        _result_format = endpoint.result_format
-        _method = request.method
-        _param_list = []
-        if request.META.get('CONTENT_TYPE') and 'json' in request.META.get('CONTENT_TYPE').lower() and request.body:
-            received_json_data = json.loads(request.body)
-            _param_list = list(received_json_data.items())
-        if _method.upper() == "POST":
-            _param_list += list(request.POST.items())
-            if request.POST.get("method"):
-                if request.POST.get("method").upper().strip() in valid_methods:
-                    _method = request.POST.get("method").upper().strip()
-        else:
-            _param_list += list(request.GET.items())
-            if request.GET.get("method") and request.GET.get("method").upper().strip() in valid_methods:
-                _method = request.GET.get("method").upper().strip()
 
+def itercsvrows(cursor, chunks):
+    """
+    yields a header row of column names followed by the rows as csv
+    """
+    writer = csv.writer(EchoBuffer())
+    yield writer.writerow(row_columns(cursor))
+    for rows in chunks:
+        yield "".join(writer.writerow(row) for row in rows)
+
+
+def get_request_parameters(request):
+    """
+    returns the http method to use (can be overridden with a method parameter) and the list of passed parameters
+    """
+    _method = request.method
+    _param_list = []
+    if request.META.get('CONTENT_TYPE') and 'json' in request.META.get('CONTENT_TYPE').lower() and request.body:
+        received_json_data = json.loads(request.body)
+        _param_list = list(received_json_data.items())
+    if _method.upper() == "POST":
+        _param_list += list(request.POST.items())
+        if request.POST.get("method"):
+            if request.POST.get("method").upper().strip() in valid_methods:
+                _method = request.POST.get("method").upper().strip()
+    else:
+        _param_list += list(request.GET.items())
+        if request.GET.get("method") and request.GET.get("method").upper().strip() in valid_methods:
+            _method = request.GET.get("method").upper().strip()
+    return _method, _param_list
+
+
+class EndpointRequest(object):
+    """
+    The state of a single endpoint call: parsed parameters, the logger (with any endpoint override applied) and the
+    statement to execute.  Shared by the sync and async views so both parse and respond the same way.
+    NOTE: only get_response touches the endpoint database (and cache) so the async view runs just that off the loop
+    """
+    def __init__(self, request, registered_endpoint, *args, **kwargs):
+        self.registered_endpoint = registered_endpoint
+        self.endpoint = registered_endpoint.endpoint
+        self.endpoint_path = self.endpoint.path
+        # we have our endpoint and not disabled so lets execute our query and return the results as json
+        self.connection_name = (self.endpoint.connection_name or "").strip()
+        self.result_format = self.endpoint.result_format
+        self.method, self.param_list = get_request_parameters(request)
         # override logging as early as possible if set (need params)
+        # NOTE: messages are passed as args so nothing is formatted unless the record is logged; the level and filter
+        #   are set for the request by get_logger first so the isEnabledFor checks cover the endpoint override too
+        logex = self.get_logger()
+        debug = logex.isEnabledFor(logging.DEBUG)
+        if debug:
+            logex.debug('path: %s', request.path)
+            logex.debug('args: %s', args)
+            logex.debug('kwargs: %s', kwargs)
+            logex.debug('overridden log level: %s', self.endpoint.log_level_override)
+            logex.debug("method: %s", self.method)
+            logex.debug("content type: %s", request.META.get('CONTENT_TYPE'))
+            logex.debug('body data: %s', request.body)
+        # info print out our params for every call
+        if logex.isEnabledFor(logging.INFO):
+            for key, value in self.param_list:
+                logex.info("     %s%s: %s%s", TermColor.F_DarkGray, key, value, TermColor.ENDC)
+        logex.debug("getting statement: %s", self.method)
+        sql = registered_endpoint.statement(self.method)
+        logex.debug("sql: %s", sql)
+        self.statement = ExecutableStatement(self.connection_name, sql, self.param_list, **kwargs)
+        self.statement.paginate(self.endpoint.page_key_field_name)
+        if debug:
+            logex.debug('statement parsed sql: %s', str(self.statement.sql).strip())
+            logex.debug('statement parameters: %s', self.statement.sql.parameter_names())
+            logex.debug('statement values: %s', self.statement.sql.parameter_values())
+            logex.debug('passed parameters: %s', self.statement.method_parameters.parameters)
+        self.logex = logex
+
+    def get_logger(self):
+        """
+        sets the endpoint's log level override (and log filter field) for this request only; see log_context.py
+        NOTE: the view clears the override when the request is done
+        """
+        endpoint = self.endpoint
         if endpoint.log_level_override:
-            log.setLevel(endpoint.log_level_override)
-            # we use the adapter to add a skip attribute to the logrecord and then filter if needed
-
+            # the override only applies when the filter field has the filter value (if there is a filter field)
             requested_value = None
             param_value = None
+            skip = False
             if endpoint.log_filter_field_name:
-                log_extra = {'skip': True}
+                skip = True
                 if endpoint.log_filter_field_value is None:
                     requested_value = ""
                 else:
                     requested_value = str(endpoint.log_filter_field_value)
-                param_tuple = get_tuple_in_list(_param_list, endpoint.log_filter_field_name)
+                param_tuple = get_tuple_in_list(self.param_list, endpoint.log_filter_field_name)
                 if param_tuple:
                     if param_tuple[1] is None:
                         param_value = ""
                     else:
                         param_value = str(param_tuple[1])
                     if param_value == requested_value:
-                        log_extra = {'skip': False}
-            else:
-                log_extra = {'skip': False}
-            logex = logging.LoggerAdapter(log, extra=log_extra)
-            logex.info(
-                f"{TermColor.BOLD}{TermColor.UNDERLINE}------- endpoint: {_endpoint_path} --------{TermColor.ENDC}")
-            logex.debug(f'filter value: {str(requested_value)}')
-            logex.debug(f'param value: {str(param_value)}')
-            logex.debug(f'log extra: {str(log_extra)}')
+                        skip = False
+            set_log_override(endpoint.log_level_override, skip)
+            log.info("%s%s------- endpoint: %s --------%s", TermColor.BOLD, TermColor.UNDERLINE, self.endpoint_path,
+                     TermColor.ENDC)
+            log.debug('filter value: %s', requested_value)
+            log.debug('param value: %s', param_value)
+            log.debug('skip: %s', skip)
         else:
-            logex = log
-            logex.info(
-                f"{TermColor.BOLD}------- endpoint: {_endpoint_path} --------{TermColor.ENDC}")
-        logex.debug(f'path: {request.path}')
-        logex.debug(f'args: {args}')
-        logex.debug(f'kwargs: {kwargs}')
-        logex.debug(f'original log level: {original_log_level}')
-        logex.debug(f'overridden log level: {log.level}')
-        logex.debug(f"method: {_method}")
-        logex.debug(f"content type: {request.META.get('CONTENT_TYPE')}")
-        logex.debug(f'body data: {str(request.body)}')
-        # info print out our params for every call
-        for key, value in _param_list:
-            logex.info(f"     {TermColor.F_DarkGray}{key}: {value}{TermColor.ENDC}")
-        property_name = _method.lower() + "_statement"
-        logex.debug(f"getting property: {property_name}")
-        sql = getattr(endpoint, property_name)
-        logex.debug(f"sql: {sql}")
-        statement = ExecutableStatement(_connection_name, sql, _param_list, **kwargs)
-        logex.debug(f'statement parsed sql: {str(statement.sql).strip()}')
-        logex.debug(f'statement parameters: {str(statement.sql.parameter_names())}')
-        logex.debug(f'statement values: {str(statement.sql.parameter_values())}')
-        logex.debug(f'passed parameters: {statement.method_parameters.parameters}')
-        if statement.sql.init_errors:
-            log.setLevel(original_log_level)
-            return HttpResponseBadRequest(statement.sql.init_errors)
-
-        statement.execute()
-        json_response = statement.get_json_response(_result_format)
-        logex.debug(f'response[{str(json_response.status_code)}]: {str(json_response.content)}')
-        logex.info(
-            f"{TermColor.BOLD}{TermColor.UNDERLINE}------- endpoint: {_endpoint_path} --------{TermColor.ENDC}")
-        log.setLevel(original_log_level)
+            log.info("%s------- endpoint: %s --------%s", TermColor.BOLD, self.endpoint_path, TermColor.ENDC)
+        return log
+
+    def get_error_response(self):
+        if self.statement.sql.init_errors:
+            return HttpResponseBadRequest(self.statement.sql.init_errors)
+        return None
+
+    def get_response(self, materialize=False):
+        """
+        returns the cached response or executes the statement and returns the results
+        materialize reads streamed results into a normal response; used when the cursor can't be read after this
+            call returns (the async view runs this on an executor thread which owns the connection)
+        """
+        endpoint = self.endpoint
+        statement = self.statement
+        logex = self.logex
+        # GET results can be cached per endpoint; see result_cache.py
+        _cache_key = None
+        if self.method == "GET" and endpoint.cache_timeout:
+            _cache_key = get_cache_key(endpoint, statement.sql.parameter_values())
+            cached_response = get_cached_response(_cache_key)
+            if cached_response is not None:
+                logex.debug('returning cached response [%s]', _cache_key)
+                logex.info("%s%s------- endpoint: %s --------%s", TermColor.BOLD, TermColor.UNDERLINE,
+                           self.endpoint_path, TermColor.ENDC)
+                return cached_response
+
+        if self.result_format in row_formats or (endpoint.stream_results and statement.can_stream()):
+            statement.execute_streaming()
+            json_response = statement.get_streaming_response(self.result_format)
+            if materialize and json_response.streaming:
+                json_response = HttpResponse(b"".join(json_response.streaming_content),
+                                             content_type=json_response['Content-Type'],
+                                             status=json_response.status_code)
+        else:
+            statement.execute(self.result_format)
+            json_response = statement.get_json_response(self.result_format)
+        if not statement.error:
+            if _cache_key and json_response.status_code == 200 and not json_response.streaming:
+                set_cached_response(_cache_key, json_response, endpoint.cache_timeout)
+            elif self.method != "GET" and endpoint.cache_tables:
+                # changes clear the cached results of any endpoint reading the same tables
+                evict_tables(endpoint.cache_table_list(), endpoint_registry)
+        if json_response.streaming:
+            logex.debug('response[%s]: <streaming>', json_response.status_code)
+        else:
+            logex.debug('response[%s]: %s', json_response.status_code, json_response.content)
+        logex.info("%s%s------- endpoint: %s --------%s", TermColor.BOLD, TermColor.UNDERLINE, self.endpoint_path,
+                   TermColor.ENDC)
         return json_response
 
+
+def raise_endpoint_not_found(endpoint_path, dneerr):
+    _msg = f'ERROR: we tried to get endpoint for [{endpoint_path}] but it was not found!\n{dneerr}'
+    print(_msg)
+    if settings.DEBUG:
+        raise Http404(_msg)
+    else:
+        raise Http404("API not found")
+
+
+def raise_connection_not_found(endpoint_path, connection_name, conerr):
+    _msg = f'ERROR: Unable to get connection [{connection_name}] for endpoint [{endpoint_path}]\n{conerr}'
+    print(_msg)
+    if settings.DEBUG:
+        raise Http404(_msg)
+    else:
+        raise Http404("Unable to connect to the database")
+
+
+def get_busy_response(busy):
+    response = HttpResponse(f"{busy}\n", status=503)
+    response['Retry-After'] = str(busy.retry_after)
+    return response
+
+
+@csrf_exempt
+def process_endpoint(request, *args, **kwargs):
+    """
+    Processes the endpoint and returns the results if there is a match in urls.py
+
+    :param request: the request object
+    :param args: any non named arguments passed to the request
+    :param kwargs: any keyword arguments passed to the request
+    :return: json response or raised exception
+    """
+    _endpoint_path = kwargs.get("endpoint_path")
+    _connection_name = ""
+    try:
+        # NOTE: registry is loaded with urls.py so we don't hit the default database for every request
+        registered_endpoint = endpoint_registry.get(_endpoint_path)
+        if registered_endpoint.endpoint.is_disabled:
+            raise Http404("API disabled")
+        _connection_name = (registered_endpoint.endpoint.connection_name or "").strip()
+        endpoint_request = EndpointRequest(request, registered_endpoint, *args, **kwargs)
+        return endpoint_request.get_error_response() or endpoint_request.get_response()
+
     except Endpoint.DoesNotExist as dneerr:
-        _msg = f'ERROR: we tried to get endpoint for [{_endpoint_path}] but it was not found!\n{dneerr}'
-        print(_msg)
-        log.setLevel(original_log_level)
-        if settings.DEBUG:
-            raise Http404(_msg)
-        else:
-            raise Http404("API not found")
+        raise_endpoint_not_found(_endpoint_path, dneerr)
     except ConnectionDoesNotExist as conerr:
-        _msg = f'ERROR: Unable to get connection [{_connection_name}] for endpoint [{_endpoint_path}]\n{conerr}'
-        print(_msg)
-        log.setLevel(original_log_level)
-        if settings.DEBUG:
-            raise Http404(_msg)
-        else:
-            raise Http404("Unable to connect to the database")
+        raise_connection_not_found(_endpoint_path, _connection_name, conerr)
+    except ConnectionBusy as busy:
+        return get_busy_response(busy)
     finally:
-        log.setLevel(original_log_level)
+        # the thread (or task) may handle another request next
+        clear_log_override()
+
+
+async def process_endpoint_async(request, *args, **kwargs):
+    """
+    Async version of process_endpoint used when ENDPOINT_ASYNC is set and served under asgi.  Parsing and logging
+    are the same; the database work runs on a bounded executor for the endpoint connection (see executor.py) so slow
+    queries don't tie up a worker.
+    NOTE: streamed results are read fully on the executor thread since the cursor belongs to that thread
+    """
+    _endpoint_path = kwargs.get("endpoint_path")
+    _connection_name = ""
+    try:
+        registered_endpoint = endpoint_registry.get_loaded(_endpoint_path)
+        if registered_endpoint is None:
+            registered_endpoint = await sync_to_async(endpoint_registry.get)(_endpoint_path)
+        if registered_endpoint.endpoint.is_disabled:
+            raise Http404("API disabled")
+        _connection_name = (registered_endpoint.endpoint.connection_name or "").strip()
+        endpoint_request = EndpointRequest(request, registered_endpoint, *args, **kwargs)
+        error_response = endpoint_request.get_error_response()
+        if error_response:
+            return error_response
+        # NOTE: the slot is claimed here on the loop so requests over the limit are turned away (or wait) without
+        #   each taking an executor thread and queueing behind the statements already running
+        limiter = get_limiter(_connection_name)
+        if limiter is None:
+            return await run_in_executor(_connection_name, endpoint_request.get_response, True)
+        await limiter.acquire_async()
+        try:
+            with holding_slot(_connection_name):
+                return await run_in_executor(_connection_name, endpoint_request.get_response, True)
+        finally:
+            limiter.release()
+
+    except Endpoint.DoesNotExist as dneerr:
+        raise_endpoint_not_found(_endpoint_path, dneerr)
+    except ConnectionDoesNotExist as conerr:
+        raise_connection_not_found(_endpoint_path, _connection_name, conerr)
+    except ConnectionBusy as busy:
+        return get_busy_response(busy)
+    finally:
+        # the thread (or task) may handle another request next
+        clear_log_override()
+
+
+# NOTE: csrf_exempt wraps the view in a sync function which would hide the coroutine from django so set it directly
+process_endpoint_async.csrf_exempt = True
@@ -1,8 +1,13 @@
+import datetime
+
+from django.conf import settings
 from django.contrib import admin
+from django.db.models import Avg, Count, Max, Q
+from django.utils import timezone
 from import_export import resources
 from import_export.admin import ImportExportActionModelAdmin
 
-from .models import SyncConfiguration, SyncRun, SyncAlert
+from .models import SyncConfiguration, SyncRun, SyncAlert, SyncTrend
 
 
 class SyncConfigurationResource(resources.ModelResource):
@@ -40,9 +45,103 @@ class SyncConfigurationAdmin(ImportExportActionModelAdmin):
 @admin.register(SyncRun)
 class SyncRunAdmin(admin.ModelAdmin):
     search_fields = ('start_date', 'end_date')
-    list_display = ('sync', 'start_date', 'end_date', 'has_succeeded')
-    list_filter = ('sync__from_connection_name', 'sync__to_connection_name', 'sync__table_name')
-    readonly_fields = ('start_date', 'end_date')
+    list_display = ('sync', 'start_date', 'end_date', 'has_succeeded', 'duration_seconds', 'rows_per_second',
+                    'rows_read', 'rows_inserted', 'rows_updated', 'rows_deleted', 'bytes_read', 'source_seconds',
+                    'target_seconds', 'write_seconds')
+    list_filter = ('has_succeeded', 'sync__from_connection_name', 'sync__to_connection_name', 'sync__table_name')
+    date_hierarchy = 'start_date'
+    readonly_fields = ('start_date', 'end_date', 'heartbeat_date', 'watermark', 'duration_seconds', 'rows_per_second',
+                       'rows_read', 'rows_compared', 'rows_inserted', 'rows_updated', 'rows_unchanged', 'rows_deleted',
+                       'bytes_read', 'source_seconds', 'target_seconds', 'write_seconds', 'checkpoint', 'chunk_stats')
+
+
+@admin.register(SyncTrend)
+class SyncTrendAdmin(admin.ModelAdmin):
+    """
+    Averages of each configuration's successful runs over the last SYNC_TREND_DAYS next to the period before it so
+    tables that are getting slower stand out
+    """
+    search_fields = ('table_name', )
+    list_display = ('table_name', 'from_connection_name', 'to_connection_name', 'runs', 'avg_seconds',
+                    'avg_rows_per_second', 'previous_rows_per_second', 'rows_per_second_change', 'avg_source_seconds',
+                    'avg_target_seconds', 'avg_write_seconds', 'avg_bytes_read', 'last_run')
+    list_display_links = None
+    list_filter = ('from_connection_name', 'to_connection_name', 'is_active')
+
+    def get_queryset(self, request):
+        days = getattr(settings, 'SYNC_TREND_DAYS', 30)
+        now = timezone.now()
+        recent = Q(syncrun__has_succeeded=True, syncrun__start_date__gte=now - datetime.timedelta(days=days))
+        previous = Q(syncrun__has_succeeded=True,
+                     syncrun__start_date__gte=now - datetime.timedelta(days=days * 2),
+                     syncrun__start_date__lt=now - datetime.timedelta(days=days))
+        return super().get_queryset(request).annotate(
+            recent_runs=Count('syncrun', filter=recent),
+            recent_seconds=Avg('syncrun__duration_seconds', filter=recent),
+            recent_rows_per_second=Avg('syncrun__rows_per_second', filter=recent),
+            previous_rows_per_second_avg=Avg('syncrun__rows_per_second', filter=previous),
+            recent_source_seconds=Avg('syncrun__source_seconds', filter=recent),
+            recent_target_seconds=Avg('syncrun__target_seconds', filter=recent),
+            recent_write_seconds=Avg('syncrun__write_seconds', filter=recent),
+            recent_bytes_read=Avg('syncrun__bytes_read', filter=recent),
+            last_run_date=Max('syncrun__start_date'),
+        )
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+    @staticmethod
+    def rounded(value, digits=1):
+        return None if value is None else round(value, digits)
+
+    @admin.display(description='runs', ordering='recent_runs')
+    def runs(self, obj):
+        return obj.recent_runs
+
+    @admin.display(description='avg seconds', ordering='recent_seconds')
+    def avg_seconds(self, obj):
+        return self.rounded(obj.recent_seconds)
+
+    @admin.display(description='avg rows/s', ordering='recent_rows_per_second')
+    def avg_rows_per_second(self, obj):
+        return self.rounded(obj.recent_rows_per_second)
+
+    @admin.display(description='previous rows/s', ordering='previous_rows_per_second_avg')
+    def previous_rows_per_second(self, obj):
+        return self.rounded(obj.previous_rows_per_second_avg)
+
+    @admin.display(description='rows/s change %')
+    def rows_per_second_change(self, obj):
+        if not obj.recent_rows_per_second or not obj.previous_rows_per_second_avg:
+            return None
+        return self.rounded((obj.recent_rows_per_second - obj.previous_rows_per_second_avg) * 100 /
+                            obj.previous_rows_per_second_avg)
+
+    @admin.display(description='avg source seconds', ordering='recent_source_seconds')
+    def avg_source_seconds(self, obj):
+        return self.rounded(obj.recent_source_seconds, 2)
+
+    @admin.display(description='avg target seconds', ordering='recent_target_seconds')
+    def avg_target_seconds(self, obj):
+        return self.rounded(obj.recent_target_seconds, 2)
+
+    @admin.display(description='avg write seconds', ordering='recent_write_seconds')
+    def avg_write_seconds(self, obj):
+        return self.rounded(obj.recent_write_seconds, 2)
+
+    @admin.display(description='avg bytes read', ordering='recent_bytes_read')
+    def avg_bytes_read(self, obj):
+        return self.rounded(obj.recent_bytes_read, 0)
+
+    @admin.display(description='last run', ordering='last_run_date')
+    def last_run(self, obj):
+        return obj.last_run_date
 
 
 @admin.register(SyncAlert)
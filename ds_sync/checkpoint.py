@@ -0,0 +1,112 @@
+"""
+Chunk checkpoints for sync runs.  A run splits the table into key ranges (one unless it is partitioned) and saves
+the last primary key written in each range on its SyncRun after every chunk, along with a heartbeat.  A run that dies
+part way can then be continued from where it stopped with sync --resume instead of starting over.
+
+    {"pk_field_name": "id", "ranges": [{"lower": null, "upper": 5000, "last_pk": 3000, "done": false}, ...]}
+
+NOTE: a range is only read after its last_pk on resume; rows before it that changed in the mean time are picked up by
+    the next full run
+NOTE: the heartbeat is also refreshed on a timer (see Heartbeat) so a slow chunk doesn't get a live run closed as stale
+"""
+import copy
+import logging
+import threading
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+from django.utils import timezone
+
+from .models import SyncRun
+
+logger = logging.getLogger(__name__)
+
+
+class RunCheckpoint(object):
+    """
+    The key ranges of a run and how far each has been synced; saved to the run as it changes (if there is a run)
+    """
+    def __init__(self, run, pk_field_name, bounds):
+        self.run = run
+        self.pk_field_name = pk_field_name
+        self.ranges = [{'lower': lower, 'upper': upper, 'last_pk': None, 'done': False} for lower, upper in bounds]
+        self.resumed_from = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def resume(cls, run, previous_run):
+        """
+        returns a checkpoint for the run that carries on from the previous run's checkpoint
+        """
+        checkpoint = cls(run, previous_run.checkpoint['pk_field_name'], [])
+        checkpoint.ranges = copy.deepcopy(previous_run.checkpoint['ranges'])
+        checkpoint.resumed_from = previous_run
+        return checkpoint
+
+    def pending(self):
+        """
+        returns (idx, lower, upper) of the ranges still to sync with lower moved up to the last key written
+        """
+        return [(idx, key_range['lower'] if key_range['last_pk'] is None else key_range['last_pk'], key_range['upper'])
+                for idx, key_range in enumerate(self.ranges) if not key_range['done']]
+
+    def update(self, idx, last_pk=None, done=False):
+        with self._lock:
+            if last_pk is not None:
+                self.ranges[idx]['last_pk'] = last_pk
+            if done:
+                self.ranges[idx]['done'] = True
+            self.save()
+
+    def save(self):
+        if self.run is None:
+            return
+        self.run.checkpoint = self.to_json()
+        self.run.heartbeat_date = timezone.now()
+        # NOTE: an update so a save from another thread doesn't write over the rest of the run
+        SyncRun.objects.filter(pk=self.run.pk).update(checkpoint=self.run.checkpoint,
+                                                      heartbeat_date=self.run.heartbeat_date)
+
+    def to_json(self):
+        return {'pk_field_name': self.pk_field_name, 'ranges': copy.deepcopy(self.ranges)}
+
+    def __str__(self):
+        done = len([key_range for key_range in self.ranges if key_range['done']])
+        return f"{done} of {len(self.ranges)} ranges done"
+
+
+class Heartbeat(object):
+    """
+    Refreshes the heartbeat of a run every SYNC_HEARTBEAT_SECONDS on a thread of its own until stopped
+    NOTE: runs already closed (as stale) are left alone
+    """
+    def __init__(self, run, interval=None):
+        self.run = run
+        self.interval = interval or getattr(settings, 'SYNC_HEARTBEAT_SECONDS', 60)
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.beat_until_stopped, name=f"sync-heartbeat-{self.run.pk}",
+                                        daemon=True)
+        self._thread.start()
+
+    def beat(self):
+        SyncRun.objects.filter(pk=self.run.pk, end_date__isnull=True).update(heartbeat_date=timezone.now())
+
+    def beat_until_stopped(self):
+        try:
+            while not self._stopped.wait(self.interval):
+                try:
+                    self.beat()
+                except DatabaseError as ex:
+                    logger.warning(f"unable to save the heartbeat of {str(self.run)}: {ex}")
+        finally:
+            # the thread's database connection isn't cleaned up by a request so close it here
+            connections.close_all()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
@@ -0,0 +1,543 @@
+"""
+Set based diff of a table between two connections.  Both sides are read in primary key order a chunk at a time and
+each source chunk is matched against the target rows in the same key range, so a sync takes a couple of queries per
+chunk instead of one per row.
+
+NOTE: key ranges are contiguous (each chunk covers everything after the previous chunk's last key up to and including
+    its own last key and the last chunk is open ended) so every target row lands in exactly one range
+NOTE: the target rows of a range are read with their own keyset paging and merged with the source chunk so a range
+    with far more target rows than source rows (or an empty source) never has to be read in one go; target only
+    keys past a chunk's worth come back in diffs of their own
+
+The source can also be read with one ordered query through a server side cursor (stream_source) which avoids
+re-seeking for every chunk on large tables; memory stays at about two chunks either way.
+
+Hashed diffs (compare_mode hash) have both databases return just the key and an md5 of each row; only rows whose
+hash differs are read in full from the source.  Both connections must be the same kind of database so the values are
+turned into text the same way.
+
+A list of (source, target) column pairs limits both queries to those columns and lines them up by position so
+unneeded columns are never read and columns can have different names in the target; the diffs have the target names.
+
+Incremental diffs (watermark) only read source rows changed since the last run and look up their target rows by key
+instead of by range; rows deleted from the source can't be seen this way.
+"""
+import logging
+import time
+
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+
+class ChunkDiff(object):
+    """
+    The rows of one source chunk classified against the target
+
+    inserts: source rows with no target row
+    updates: source rows whose target row differs
+    unchanged: number of source rows matching the target
+    target_only: keys of target rows in the chunk's range with no source row
+    source_keys: keys of every source row in the chunk
+    rows_read, bytes_read: rows (and about how many bytes) read from both sides for the chunk
+    source_seconds, target_seconds: time spent reading each side
+    """
+    def __init__(self, columns, pk_index):
+        self.columns = columns
+        self.pk_index = pk_index
+        self.inserts = []
+        self.updates = []
+        self.unchanged = 0
+        self.target_only = []
+        self.source_keys = []
+        self.rows_read = 0
+        self.bytes_read = 0
+        self.source_seconds = 0.0
+        self.target_seconds = 0.0
+
+    def __len__(self):
+        return len(self.inserts) + len(self.updates) + self.unchanged
+
+    def __str__(self):
+        return (f"inserts: {len(self.inserts)} updates: {len(self.updates)} unchanged: {self.unchanged} "
+                f"target only: {len(self.target_only)}")
+
+
+class SyncStats(object):
+    """
+    Totals for the chunks of a sync (or one partition of it)
+    NOTE: chunk_stats keeps a dict per chunk (up to CHUNK_STATS_MAX) to see where the time goes on a slow run
+    """
+    CHUNK_STATS_MAX = 1000
+
+    def __init__(self, name=""):
+        self.name = name
+        self.chunks = 0
+        self.rows_read = 0
+        self.rows_compared = 0
+        self.bytes_read = 0
+        self.inserted = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.target_only = 0
+        self.deleted = 0
+        self.source_seconds = 0.0
+        self.target_seconds = 0.0
+        self.write_seconds = 0.0
+        self.chunk_stats = []
+
+    def add(self, diff):
+        self.chunks += 1
+        self.rows_read += diff.rows_read
+        self.rows_compared += len(diff)
+        self.bytes_read += diff.bytes_read
+        self.unchanged += diff.unchanged
+        self.target_only += len(diff.target_only)
+        self.source_seconds += diff.source_seconds
+        self.target_seconds += diff.target_seconds
+
+    def add_chunk_stats(self, diff, write_seconds, range_idx=0):
+        """
+        adds the time spent writing the chunk and keeps its counts in chunk_stats
+        """
+        self.write_seconds += write_seconds
+        if len(self.chunk_stats) >= self.CHUNK_STATS_MAX:
+            return
+        self.chunk_stats.append({
+            'range': range_idx,
+            'last_pk': diff.source_keys[-1] if diff.source_keys else None,
+            'rows_read': diff.rows_read,
+            'bytes_read': diff.bytes_read,
+            'inserted': len(diff.inserts),
+            'updated': len(diff.updates),
+            'unchanged': diff.unchanged,
+            'target_only': len(diff.target_only),
+            'source_seconds': round(diff.source_seconds, 4),
+            'target_seconds': round(diff.target_seconds, 4),
+            'write_seconds': round(write_seconds, 4),
+        })
+
+    def merge(self, other):
+        self.chunks += other.chunks
+        self.rows_read += other.rows_read
+        self.rows_compared += other.rows_compared
+        self.bytes_read += other.bytes_read
+        self.inserted += other.inserted
+        self.updated += other.updated
+        self.unchanged += other.unchanged
+        self.target_only += other.target_only
+        self.deleted += other.deleted
+        self.source_seconds += other.source_seconds
+        self.target_seconds += other.target_seconds
+        self.write_seconds += other.write_seconds
+        self.chunk_stats += other.chunk_stats[:max(0, self.CHUNK_STATS_MAX - len(self.chunk_stats))]
+
+    def __str__(self):
+        return (f"{self.name + ' ' if self.name else ''}chunks: {self.chunks} inserted: {self.inserted} "
+                f"updated: {self.updated} unchanged: {self.unchanged} target only: {self.target_only} "
+                f"deleted: {self.deleted}")
+
+
+def row_bytes(rows):
+    """
+    returns about how many bytes the rows take; text and binary values by length and anything else as 8
+    """
+    size = 0
+    for row in rows:
+        for value in row:
+            if value is None:
+                continue
+            if isinstance(value, (str, bytes, bytearray, memoryview)):
+                size += len(value)
+            else:
+                size += 8
+    return size
+
+
+def is_dirty(from_result, to_result):
+    if not to_result:
+        return True
+    from_value_list = list(from_result)
+    to_value_list = list(to_result)
+    for idx, value in enumerate(from_value_list):
+        if to_value_list[idx] != value:
+            return True
+    return False
+
+
+def get_pk_index(cursor, pk_field_name):
+    columns = [col[0] for col in cursor.description]
+    return columns, columns.index(pk_field_name)
+
+
+def iter_source_chunks(cursor, table_name, pk_field_name, chunk_size, watermark_field_name=None, watermark=None,
+                       select="*", lower=None, upper=None, condition=None):
+    """
+    yields (columns, rows, is_last) for the table in key order using keyset paging (where pk > last order by pk)
+    only rows with a watermark >= the passed watermark are read if set
+    only rows with lower < pk <= upper are read if set
+    only rows matching the condition (sql without parameters) are read if set
+    """
+    last_pk = lower
+    while True:
+        sql = f"select {select} from {table_name}"
+        where = [condition] if condition else []
+        params = []
+        if watermark_field_name and watermark is not None:
+            # NOTE: >= since rows changed in the same tick as the last run's high-water mark may not have been read
+            where.append(f"{watermark_field_name} >= %s")
+            params.append(watermark)
+        if last_pk is not None:
+            where.append(f"{pk_field_name} > %s")
+            params.append(last_pk)
+        if upper is not None:
+            where.append(f"{pk_field_name} <= %s")
+            params.append(upper)
+        if where:
+            sql += " where " + " and ".join(where)
+        sql += f" order by {pk_field_name} limit %s"
+        params.append(chunk_size)
+        cursor.execute(sql, params)
+        columns, pk_index = get_pk_index(cursor, pk_field_name)
+        rows = cursor.fetchall()
+        is_last = len(rows) < chunk_size
+        yield columns, rows, is_last
+        if is_last:
+            return
+        last_pk = rows[-1][pk_index]
+
+
+def count_target_only(from_connection_name, to_connection_name, table_name, pk_field_name, target_pk_field_name,
+                      chunk_size=1000, target_condition=None):
+    """
+    counts the target rows with no source row without writing anything; reads just the keys of both sides in the
+    same ranges as diff_table so only about a chunk of keys is held at a time
+    target_condition limits the target rows counted (like the rows not already marked deleted)
+    """
+    count = 0
+    with connections[from_connection_name].cursor() as from_cursor, \
+            connections[to_connection_name].cursor() as to_cursor:
+        last_pk = None
+        for _columns, rows, is_last in iter_source_chunks(from_cursor, table_name, pk_field_name, chunk_size,
+                                                          select=pk_field_name):
+            source_keys = {row[0] for row in rows}
+            # NOTE: the last range is open ended so target keys past the last source key are counted too
+            upto_pk = None if is_last else rows[-1][0]
+            for _target_columns, target_rows, _is_last in iter_source_chunks(
+                    to_cursor, table_name, target_pk_field_name, chunk_size * 2, select=target_pk_field_name,
+                    lower=last_pk, upper=upto_pk, condition=target_condition):
+                count += sum(1 for row in target_rows if row[0] not in source_keys)
+            last_pk = upto_pk
+    return count
+
+
+def server_side_cursor(connection):
+    """
+    returns a cursor that reads rows from the server as they are fetched instead of buffering the whole result
+    NOTE: mysqlclient buffers by default (django's chunked_cursor is a normal cursor there) so use its SSCursor;
+        postgres gets a named cursor and sqlite cursors are already lazy
+    """
+    if connection.vendor == 'mysql':
+        from MySQLdb.cursors import SSCursor
+        connection.ensure_connection()
+        return connection.connection.cursor(SSCursor)
+    return connection.chunked_cursor()
+
+
+def can_stream_source(from_connection_name, to_connection_name):
+    """
+    an unbuffered mysql cursor ties up its connection until every row is read so the target can't share it
+    """
+    if from_connection_name != to_connection_name:
+        return True
+    return connections[from_connection_name].vendor != 'mysql'
+
+
+def iter_source_stream(connection_name, table_name, pk_field_name, chunk_size, watermark_field_name=None,
+                       watermark=None, select="*", lower=None, upper=None):
+    """
+    same as iter_source_chunks but reads the table with one ordered query through a server side cursor
+    """
+    sql = f"select {select} from {table_name}"
+    where = []
+    params = []
+    if watermark_field_name and watermark is not None:
+        where.append(f"{watermark_field_name} >= %s")
+        params.append(watermark)
+    if lower is not None:
+        where.append(f"{pk_field_name} > %s")
+        params.append(lower)
+    if upper is not None:
+        where.append(f"{pk_field_name} <= %s")
+        params.append(upper)
+    if where:
+        sql += " where " + " and ".join(where)
+    sql += f" order by {pk_field_name}"
+    cursor = server_side_cursor(connections[connection_name])
+    try:
+        cursor.execute(sql, params)
+        columns = [col[0] for col in cursor.description]
+        rows = cursor.fetchmany(chunk_size)
+        while True:
+            # read ahead one chunk so we know when we are on the last one (its key range is open ended)
+            next_rows = cursor.fetchmany(chunk_size) if rows else []
+            yield columns, list(rows), not next_rows
+            if not next_rows:
+                return
+            rows = next_rows
+    finally:
+        cursor.close()
+
+
+def iter_timed(iterable):
+    """
+    yields (item, seconds it took to get the item) so reading can be timed apart from what the caller does with it
+    """
+    iterator = iter(iterable)
+    while True:
+        started = time.monotonic()
+        item = next(iterator, None)
+        seconds = time.monotonic() - started
+        if item is None:
+            return
+        yield item, seconds
+
+
+def fetch_target_keys(cursor, table_name, pk_field_name, keys, batch_size=500, select="*"):
+    """
+    returns the target rows by key for the passed keys
+    NOTE: looked up in batches since some backends limit the parameters per statement
+    """
+    target_rows = {}
+    for idx in range(0, len(keys), batch_size):
+        batch = keys[idx:idx + batch_size]
+        in_list = ", ".join(["%s"] * len(batch))
+        cursor.execute(f"select {select} from {table_name} where {pk_field_name} in ({in_list})", batch)
+        _columns, pk_index = get_pk_index(cursor, pk_field_name)
+        for row in cursor.fetchall():
+            target_rows[row[pk_index]] = row
+    return target_rows
+
+
+def get_columns(cursor, table_name):
+    cursor.execute(f"select * from {table_name} where 1=0")
+    return [col[0] for col in cursor.description]
+
+
+def can_hash(from_connection_name, to_connection_name):
+    """
+    hashes only match if both sides turn values into text the same way
+    """
+    from_vendor = connections[from_connection_name].vendor
+    to_vendor = connections[to_connection_name].vendor
+    return from_vendor == to_vendor and from_vendor in ('mysql', 'postgresql', 'sqlite')
+
+
+def row_hash_sql(connection, columns):
+    """
+    returns the sql for an md5 of the columns of a row
+    NOTE: nulls are replaced with a marker so null and '' hash differently; sqlite has no concat_ws but django
+        registers an md5 function on its connections
+    """
+    cast_type = 'char' if connection.vendor == 'mysql' else 'text'
+    values = [f"coalesce(cast({column} as {cast_type}), '~null~')" for column in columns]
+    if connection.vendor == 'sqlite':
+        return "md5(" + " || '|' || ".join(values) + ")"
+    return f"md5(concat_ws('|', {', '.join(values)}))"
+
+
+def get_partition_bounds(connection_name, table_name, pk_field_name, partitions):
+    """
+    splits the source table into key ranges of about the same size; returns a list of (lower, upper) where lower is
+    exclusive, upper inclusive and the first lower and last upper are None (open ended)
+    NOTE: integer keys are split evenly between min and max; other keys (strings, uuids) by sampling the key at each
+        quantile which costs a query per partition
+    """
+    with connections[connection_name].cursor() as cursor:
+        cursor.execute(f"select min({pk_field_name}), max({pk_field_name}), count(*) from {table_name}")
+        low, high, count = cursor.fetchone()
+        if not count or partitions < 2:
+            return [(None, None)]
+        if isinstance(low, int) and isinstance(high, int):
+            step = (high - low) / partitions
+            cuts = [low + int(step * idx) for idx in range(1, partitions)]
+        else:
+            cuts = []
+            for idx in range(1, partitions):
+                cursor.execute(f"select {pk_field_name} from {table_name} order by {pk_field_name} limit 1 offset %s",
+                               [count * idx // partitions])
+                row = cursor.fetchone()
+                if row:
+                    cuts.append(row[0])
+    bounds = []
+    lower = None
+    for cut in cuts:
+        # small or skewed tables can give the same cut more than once
+        if lower is not None and cut <= lower:
+            continue
+        bounds.append((lower, cut))
+        lower = cut
+    bounds.append((lower, None))
+    return bounds
+
+
+def get_max_watermark(connection_name, table_name, watermark_field_name):
+    """
+    returns the highest watermark in the source table (None if empty)
+    NOTE: read before the first chunk so rows changed while the run is going are read again by the next run instead
+        of being skipped because a later row in key order had a higher watermark
+    """
+    with connections[connection_name].cursor() as cursor:
+        cursor.execute(f"select max({watermark_field_name}) from {table_name}")
+        row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def diff_chunk(columns, pk_index, rows, target_rows):
+    diff = ChunkDiff(columns, pk_index)
+    diff.source_keys = [row[pk_index] for row in rows]
+    for row in rows:
+        target_row = target_rows.pop(row[pk_index], None)
+        if target_row is None:
+            diff.inserts.append(row)
+        elif is_dirty(row, target_row):
+            diff.updates.append(row)
+        else:
+            diff.unchanged += 1
+    # whatever is left was not in the source
+    diff.target_only = list(target_rows)
+    return diff
+
+
+def diff_hashed_chunk(cursor, table_name, pk_field_name, columns, rows, target_rows, select="*"):
+    """
+    classifies (pk, hash) rows against the target (pk, hash) rows and reads the full source rows that changed
+    """
+    pk_index = columns.index(pk_field_name)
+    diff = ChunkDiff(columns, pk_index)
+    diff.source_keys = [row[0] for row in rows]
+    insert_keys = []
+    update_keys = []
+    for row in rows:
+        target_row = target_rows.pop(row[0], None)
+        if target_row is None:
+            insert_keys.append(row[0])
+        elif target_row[1] != row[1]:
+            update_keys.append(row[0])
+        else:
+            diff.unchanged += 1
+    diff.target_only = list(target_rows)
+    if insert_keys or update_keys:
+        source_rows = fetch_target_keys(cursor, table_name, pk_field_name, insert_keys + update_keys, select=select)
+        diff.inserts = [source_rows[key] for key in insert_keys if key in source_rows]
+        diff.updates = [source_rows[key] for key in update_keys if key in source_rows]
+    return diff
+
+
+def diff_table(from_connection_name, to_connection_name, table_name, pk_field_name, chunk_size=1000,
+               watermark_field_name=None, watermark=None, stream_source=False, compare_mode="rows", lower=None,
+               upper=None, columns=None):
+    """
+    yields a ChunkDiff for each chunk of the source table (or the lower < pk <= upper range of it)
+    only rows changed since the passed watermark (of watermark_field_name) are read if it is set
+    stream_source reads the source through a server side cursor instead of keyset paging (see can_stream_source)
+    compare_mode hash compares md5s of the rows computed by each database (see can_hash)
+    columns is a list of (source, target) column pairs to sync instead of every column as is
+    NOTE: the target is read through its own cursor so the caller can write to the target between chunks
+    """
+    incremental = bool(watermark_field_name) and watermark is not None
+    hashed = compare_mode == "hash"
+    select = target_select = "*"
+    source_columns = target_columns = None
+    target_pk_field_name = pk_field_name
+    if columns:
+        source_columns = [source for source, _target in columns]
+        target_columns = [target for _source, target in columns]
+        target_pk_field_name = target_columns[source_columns.index(pk_field_name)]
+        select = ", ".join(source_columns)
+        target_select = ", ".join(target_columns)
+    with connections[from_connection_name].cursor() as from_cursor, \
+            connections[to_connection_name].cursor() as to_cursor:
+        row_select = select
+        if hashed:
+            # the source cursor is also used to read the changed rows so it can't be streaming
+            stream_source = False
+            if source_columns is None:
+                source_columns = target_columns = get_columns(from_cursor, table_name)
+            select = (f"{pk_field_name}, {row_hash_sql(connections[from_connection_name], source_columns)} "
+                      f"as ds_row_hash")
+            target_select = (f"{target_pk_field_name}, {row_hash_sql(connections[to_connection_name], target_columns)} "
+                             f"as ds_row_hash")
+        if stream_source:
+            source_chunks = iter_source_stream(from_connection_name, table_name, pk_field_name, chunk_size,
+                                               watermark_field_name, watermark, select, lower, upper)
+        else:
+            source_chunks = iter_source_chunks(from_cursor, table_name, pk_field_name, chunk_size,
+                                               watermark_field_name, watermark, select, lower, upper)
+        last_pk = lower
+        for (chunk_columns, rows, is_last), source_seconds in iter_timed(source_chunks):
+            pk_index = chunk_columns.index(pk_field_name)
+            diff_columns = target_columns if target_columns is not None else chunk_columns
+            diff_pk_index = source_columns.index(pk_field_name) if hashed else pk_index
+            rows_read = len(rows)
+            bytes_read = row_bytes(rows)
+            target_seconds = 0.0
+            target_only = []
+            if incremental:
+                started = time.monotonic()
+                target_rows = fetch_target_keys(to_cursor, table_name, target_pk_field_name,
+                                                [row[pk_index] for row in rows], select=target_select)
+                target_seconds = time.monotonic() - started
+                rows_read += len(target_rows)
+                bytes_read += row_bytes(target_rows.values())
+            else:
+                # merge the target rows in the chunk's key range with the source rows a page at a time
+                upto_pk = upper if is_last else rows[-1][pk_index]
+                source_keys = set(row[pk_index] for row in rows)
+                target_rows = {}
+                target_pages = iter_source_chunks(to_cursor, table_name, target_pk_field_name, chunk_size * 2,
+                                                  select=target_select, lower=last_pk, upper=upto_pk)
+                for (target_page_columns, target_page, _is_last), seconds in iter_timed(target_pages):
+                    target_seconds += seconds
+                    rows_read += len(target_page)
+                    bytes_read += row_bytes(target_page)
+                    target_pk_index = target_page_columns.index(target_pk_field_name)
+                    for row in target_page:
+                        key = row[target_pk_index]
+                        if key in source_keys:
+                            target_rows[key] = row
+                        else:
+                            target_only.append(key)
+                    if len(target_only) >= chunk_size:
+                        # a lot more target rows than source rows in the range (rows deleted from the source) so
+                        #   hand the keys back in a diff of their own instead of holding them all
+                        diff = ChunkDiff(diff_columns, diff_pk_index)
+                        diff.target_only = target_only
+                        diff.rows_read = rows_read - len(rows)
+                        diff.bytes_read = bytes_read - row_bytes(rows)
+                        diff.target_seconds = target_seconds
+                        yield diff
+                        target_only = []
+                        rows_read = len(rows)
+                        bytes_read = row_bytes(rows)
+                        target_seconds = 0.0
+            if hashed:
+                # mostly reading the changed rows from the source
+                started = time.monotonic()
+                diff = diff_hashed_chunk(from_cursor, table_name, pk_field_name, source_columns, rows, target_rows,
+                                         select=row_select)
+                source_seconds += time.monotonic() - started
+                rows_read += len(diff.inserts) + len(diff.updates)
+                bytes_read += row_bytes(diff.inserts) + row_bytes(diff.updates)
+            else:
+                diff = diff_chunk(chunk_columns, pk_index, rows, target_rows)
+            diff.target_only += target_only
+            diff.rows_read = rows_read
+            diff.bytes_read = bytes_read
+            diff.source_seconds = source_seconds
+            diff.target_seconds = target_seconds
+            # the rows are written to the target so they go by the target names
+            diff.columns = diff_columns
+            yield diff
+            if rows:
+                last_pk = rows[-1][pk_index]
@@ -1,11 +1,22 @@
 import datetime
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from django.utils import timezone
 
 from django.core.management.base import BaseCommand
 from argparse import RawTextHelpFormatter
+from django.conf import settings
 from django.db import IntegrityError, connections
+from django.db.models import Q
 import logging
-from ds_app.utils import table_exists, LogBuffer, to_bool, dictfetchall, namedtuplefetchall
+from ds_app.schema import get_cached_schema
+from ds_app.utils import get_table_schema, table_exists, LogBuffer, to_bool
+from ds_sync.checkpoint import Heartbeat, RunCheckpoint
+from ds_sync.diff import SyncStats, can_hash, can_stream_source, count_target_only, diff_table, get_max_watermark
+from ds_sync.diff import get_partition_bounds
+from ds_sync.watermark import dump_watermark
+from ds_sync.writer import BatchWriter, DeleteLimit, unmarked_sql
 
 
 from ds_sync.models import *
@@ -15,25 +26,67 @@ logger = logging.getLogger(__name__)
 
 
 def validate_config(config: SyncConfiguration) -> None:
+    # NOTE: table metadata is cached (see ds_app/schema.py) so validating a channel of configs doesn't hit the
+    #   databases for every config
     validation_errors = []
-    if not table_exists(config.table_name, config.from_connection_name):
+    source_schema = get_cached_schema(config.from_connection_name, config.table_name)
+    if source_schema is None:
         validation_errors.append(
             f"Source table [{str(config.from_connection_name)}]:[{str(config.table_name)}] not found!")
     if not table_exists(config.table_name, config.to_connection_name):
         validation_errors.append(
             f"Target table [{str(config.to_connection_name)}]:[{str(config.table_name)}] not found!")
-    with connections[config.from_connection_name].cursor() as from_cursor:
-        from_cursor.execute(f"select * from {config.table_name}")
-        columns = [col[0] for col in from_cursor.description]
-        if config.pk_field_name not in columns:
-            validation_errors.append(
-                f"PK field [{config.pk_field_name}] does not exist in source table ["
-                f"{str(config.from_connection_name)}]:[{str(config.table_name)}]!"
-            )
+    if source_schema is not None and not source_schema.has_column(config.pk_field_name):
+        validation_errors.append(
+            f"PK field [{config.pk_field_name}] does not exist in source table ["
+            f"{str(config.from_connection_name)}]:[{str(config.table_name)}]!"
+        )
+    if source_schema is not None:
+        try:
+            columns = get_sync_columns(config, source_schema.columns)
+        except IntegrityError as ex:
+            validation_errors.append(str(ex))
+            columns = None
+        target_schema = get_cached_schema(config.to_connection_name, config.table_name)
+        if columns and target_schema is not None:
+            missing_columns = [target for _source, target in columns if not target_schema.has_column(target)]
+            if missing_columns:
+                validation_errors.append(
+                    f"Columns {missing_columns} do not exist in target table ["
+                    f"{str(config.to_connection_name)}]:[{str(config.table_name)}]!")
+    if config.delete_mode == 'soft' and not config.soft_delete_field_name:
+        validation_errors.append("A soft delete field is required to mark deleted rows!")
     if validation_errors:
         raise IntegrityError("\n".join(validation_errors))
 
 
+def get_sync_columns(config: SyncConfiguration, source_columns: list) -> list:
+    """
+    returns the (source, target) column pairs to sync in source table order or None to sync every column as is
+    NOTE: the primary key and watermark are synced even if not included (or excluded)
+    """
+    include_columns = config.include_column_list()
+    exclude_columns = config.exclude_column_list()
+    column_map = config.column_map_dict()
+    if not include_columns and not exclude_columns and not column_map:
+        return None
+    unknown_columns = [column for column in include_columns + exclude_columns + list(column_map)
+                       if column not in source_columns]
+    if unknown_columns:
+        raise IntegrityError(f"Columns {unknown_columns} do not exist in source table ["
+                             f"{str(config.from_connection_name)}]:[{str(config.table_name)}]!")
+    required_columns = [config.pk_field_name, config.watermark_field_name]
+    columns = []
+    for column in source_columns:
+        if column not in required_columns:
+            if include_columns and column not in include_columns:
+                continue
+            if column in exclude_columns:
+                continue
+        columns.append((column, column_map.get(column, column)))
+    return columns
+
+
 # def sync_config_old(log, config: SyncConfiguration) -> SyncRun:
 #     log.warning(f"syncing {str(config)}...")
 #     run = None
@@ -48,89 +101,312 @@ def validate_config(config: SyncConfiguration) -> None:
 #     run = SyncRun.objects.create(sync=config)
 #     log.debug(f"created {str(run)}")
 #     return run
-def is_dirty(from_result, to_result):
-    if not to_result:
+def close_stale_runs(log: LogBuffer, config: SyncConfiguration) -> None:
+    """
+    marks runs of the config that stopped sending heartbeats (killed, timed out, deployed over) as failed so they no
+    longer block the config and can be resumed
+    """
+    stale_date = timezone.now() - datetime.timedelta(minutes=getattr(settings, 'SYNC_STALE_MINUTES', 60))
+    stale_runs = SyncRun.objects.filter(sync=config, end_date__isnull=True).filter(
+        Q(heartbeat_date__lt=stale_date) | Q(heartbeat_date__isnull=True, start_date__lt=stale_date))
+    for stale_run in stale_runs:
+        log.warning(f"closing stale run {str(stale_run)}; last heartbeat [{str(stale_run.heartbeat_date)}]")
+        SyncRun.objects.filter(pk=stale_run.pk).update(
+            end_date=timezone.now(), has_succeeded=False,
+            log=(stale_run.log or "") + "\nrun stopped sending heartbeats; closed as stale")
+
+
+def save_run(run: SyncRun) -> bool:
+    """
+    saves the finished run unless it was closed as stale while it was running, in which case the closure is kept and
+    the run's log and counts are added to it; returns False if it was closed
+    """
+    fields = {field.attname: getattr(run, field.attname) for field in run._meta.concrete_fields
+              if not field.primary_key}
+    if SyncRun.objects.filter(pk=run.pk, end_date__isnull=True).update(**fields):
         return True
-    from_value_list = list(from_result)
-    to_value_list = list(to_result)
-    for idx, value in enumerate(from_value_list):
-        if to_value_list[idx] != value:
-            return True
+    closed_run = SyncRun.objects.get(pk=run.pk)
+    fields.update(end_date=closed_run.end_date, has_succeeded=closed_run.has_succeeded,
+                  log=f"{closed_run.log or ''}\n{run.log or ''}")
+    SyncRun.objects.filter(pk=run.pk).update(**fields)
     return False
 
 
-def sync_config(log: LogBuffer, config: SyncConfiguration) -> None:
+def get_checkpoint(log: LogBuffer, config: SyncConfiguration, run: SyncRun = None,
+                   resume: bool = False) -> RunCheckpoint:
+    """
+    returns the checkpoint to carry on from with resume if there is one otherwise a new one for the config's key
+    ranges
+    """
+    if resume and run:
+        previous_run = config.resumable_run()
+        if previous_run is None:
+            log.info("no failed run to resume; syncing everything")
+        elif previous_run.checkpoint.get('pk_field_name') != config.pk_field_name:
+            log.warning(f"the primary key has changed since {str(previous_run)}; syncing everything")
+        else:
+            checkpoint = RunCheckpoint.resume(run, previous_run)
+            log.info(f"resuming {str(previous_run)}; {str(checkpoint)}")
+            return checkpoint
+    if config.partitions > 1:
+        bounds = get_partition_bounds(config.from_connection_name, config.table_name, config.pk_field_name,
+                                      config.partitions)
+    else:
+        bounds = [(None, None)]
+    return RunCheckpoint(run, config.pk_field_name, bounds)
+
+
+def sync_config(log: LogBuffer, config: SyncConfiguration, run: SyncRun = None, resume: bool = False) -> None:
     log.info(f"syncing {str(config)}...")
     # validate the config
     validate_config(config)
+    close_stale_runs(log, config)
     # skip if there is a process still running for this config
     # NOTE: we will always have one open for this run so look for > 1
     running = SyncRun.objects.filter(sync=config, end_date__isnull=True)
     if len(running) > 1:
         log.warning(f"[{str(config)}] has not completed; skipping run!")
         return None
-    # pull the data from the source connection
-    query_sql = f"select * from {config.table_name}"
-    pk_where = f" where {config.pk_field_name}=%s"
-    updated_total = 0
-    with connections[config.from_connection_name].cursor() as from_cursor:
-        from_cursor.execute(query_sql)
-        from_results = namedtuplefetchall(from_cursor)
-        with connections[config.to_connection_name].cursor() as to_cursor:
-            for from_result in from_results:
-                log.debug(f"from: {str(from_result)}")
-                to_cursor.execute(query_sql + pk_where, [getattr(from_result, config.pk_field_name)])
-                to_results = namedtuplefetchall(to_cursor)
-                if len(to_results) > 0:
-                    # update to record since it exists
-                    to_result = to_results[0]
-                    log.debug(f"to: {str(to_result)}")
-                    if is_dirty(from_result, to_result):
-                        log.debug(f"updating...")
-                        field_list = from_result._fields
-                        value_list = list(from_result)
-                        update_field_list = []
-                        for field in field_list:
-                            update_field_list.append(str(field) + "=%s")
-                        # log.debug(f"update field list: {update_field_list}")
-                        update_sql = f"update {config.table_name} set {', '.join(update_field_list)} {pk_where}"
-                        log.debug(f"update sql: {update_sql}")
-                        value_list.append(getattr(from_result, config.pk_field_name))
-                        to_cursor.execute(update_sql, value_list)
-                        updated_recs = to_cursor.rowcount
-                        updated_total += updated_recs
-                        log.debug(f"updated recs: {updated_recs}")
-                    else:
-                        log.debug("not dirty. skipping...")
-                        log.debug(f"updated recs: 0")
-                else:
-                    # add to record since it doesn't exist
-                    log.debug(f"adding...")
-                    # get our fields from the named tuple
-                    field_list = from_result._fields
-                    field_list_str = ", ".join(field_list)
-                    # our value list is %s for each value which we will pass as params on execute
-                    rng = range(len(from_result))
-                    # value_list = ["{:02d}".format(x) for x in rng]
-                    value_list = ["%s" for x in rng]
-                    log.debug(f"value list: {value_list}")
-                    value_list_str = ", ".join(value_list)
-                    log.debug(f"value list str: {value_list_str}")
-                    insert_sql = f"insert into {config.table_name} ({field_list_str}) values ({value_list_str})"
-                    log.debug(f"insert sql: \n {insert_sql}")
-                    value_params = list(from_result)
-                    log.debug(f"value_params: {value_params}")
-                    to_cursor.execute(insert_sql, value_params)
-                    updated_recs = to_cursor.rowcount
-                    updated_total += updated_recs
-                    log.debug(f"updated recs: {updated_recs}")
-    log.info(f"total updated recs: {updated_total}")
+    started = time.monotonic()
+    checkpoint = get_checkpoint(log, config, run, resume)
+    watermark = config.last_watermark()
+    if config.watermark_field_name:
+        log.info(f"syncing rows with {config.watermark_field_name} >= [{watermark}]")
+    stream_source = config.stream_source
+    if stream_source and not can_stream_source(config.from_connection_name, config.to_connection_name):
+        log.warning("source and target share a mysql connection; reading the source a chunk at a time instead")
+        stream_source = False
+    compare_mode = config.compare_mode
+    if compare_mode == 'hash' and not can_hash(config.from_connection_name, config.to_connection_name):
+        log.warning("hash compare needs both connections to be the same kind of database; comparing rows instead")
+        compare_mode = 'rows'
+    delete_mode = config.delete_mode
+    if delete_mode != 'none' and config.watermark_field_name and watermark is not None:
+        log.info("incremental run; deleted rows are only found on full runs")
+        delete_mode = 'none'
+    if delete_mode != 'none' and checkpoint.resumed_from:
+        log.info("resumed run; deleted rows are only found on full runs")
+        delete_mode = 'none'
+    high_watermark = None
+    if config.watermark_field_name and not checkpoint.resumed_from:
+        # NOTE: taken before any rows are read; rows changed while the run is going are read again next time
+        high_watermark = get_max_watermark(config.from_connection_name, config.table_name,
+                                           config.watermark_field_name)
+    # see diff.py for how the source and target are compared
+    diff_options = {
+        'chunk_size': getattr(settings, 'SYNC_CHUNK_SIZE', 1000),
+        'watermark_field_name': config.watermark_field_name,
+        'watermark': watermark,
+        'stream_source': stream_source,
+        'compare_mode': compare_mode,
+        'columns': get_sync_columns(config, get_table_schema(config.table_name, config.from_connection_name).columns),
+    }
+    delete_limit = get_delete_limit(log, config, delete_mode) if delete_mode != 'none' else None
+    # NOTE: the ranges add to stats as they go so a run that fails still records how far it got
+    stats = SyncStats()
+    try:
+        if len(checkpoint.ranges) > 1:
+            sync_partitions(log, config, diff_options, delete_mode, checkpoint, delete_limit, stats)
+        else:
+            for idx, lower, upper in checkpoint.pending():
+                sync_range(log, config, diff_options, delete_mode, lower, upper, checkpoint, idx, delete_limit,
+                           stats)
+        log.info(f"total updated recs: {stats.inserted + stats.updated}")
+        if delete_mode == 'soft':
+            log.info(f"marked deleted recs: {stats.deleted}" if stats.deleted else "no rows to delete")
+        elif delete_mode != 'none':
+            log.info(f"deleted recs: {stats.deleted}" if stats.deleted else "no rows to delete")
+    finally:
+        if run:
+            record_run_stats(log, run, stats, time.monotonic() - started)
+    # only saved once everything is written so a failed run is picked up again next time
+    if run and config.watermark_field_name:
+        # NOTE: a resumed run didn't read the ranges done before it stopped so it can't move the watermark forward
+        if high_watermark is None:
+            high_watermark = watermark
+        run.watermark = dump_watermark(high_watermark)
+        log.info(f"watermark: {high_watermark}")
+
+
+def record_run_stats(log: LogBuffer, run: SyncRun, stats: SyncStats, seconds: float) -> None:
+    """
+    copies the counts and timings of the sync onto the run (saved with the run)
+    """
+    run.rows_read = stats.rows_read
+    run.rows_compared = stats.rows_compared
+    run.rows_inserted = stats.inserted
+    run.rows_updated = stats.updated
+    run.rows_unchanged = stats.unchanged
+    run.rows_deleted = stats.deleted
+    run.bytes_read = stats.bytes_read
+    run.source_seconds = round(stats.source_seconds, 3)
+    run.target_seconds = round(stats.target_seconds, 3)
+    run.write_seconds = round(stats.write_seconds, 3)
+    run.duration_seconds = round(seconds, 3)
+    run.rows_per_second = round(stats.rows_compared / seconds, 1) if seconds > 0 else None
+    run.chunk_stats = stats.chunk_stats
+    # NOTE: partitions read and write at the same time so the source, target and write times can add up to more
+    #   than the run took
+    log.info(f"rows read: {run.rows_read} bytes read: {run.bytes_read} rows/s: {run.rows_per_second} "
+             f"seconds (source/target/write/total): {run.source_seconds}/{run.target_seconds}/{run.write_seconds}/"
+             f"{run.duration_seconds}")
+
+
+def get_delete_limit(log: LogBuffer, config: SyncConfiguration, delete_mode: str) -> DeleteLimit:
+    """
+    counts the target rows that are not in the source before anything is written and fails the run if deleting them
+    would go over the delete threshold; returns the limit on the rows the run may delete
+    NOTE: the limit is also checked as each chunk is deleted in case rows change while the run is going
+    """
+    target_pk_field_name = config.target_column(config.pk_field_name)
+    writer = BatchWriter(config.to_connection_name, config.table_name, target_pk_field_name, [target_pk_field_name])
+    target_condition = None
+    marked_count = 0
+    if delete_mode == 'soft':
+        # rows marked by an earlier run are still in the target; don't count them again
+        target_condition = unmarked_sql(config.soft_delete_field_name)
+        marked_count = writer.count(f"not {target_condition}")
+    target_count = writer.count(target_condition)
+    delete_limit = DeleteLimit(target_count, config.delete_threshold, marked_count)
+    if target_count <= delete_limit.max_rows:
+        # can't go over even if every target row goes
+        missing = None
+    else:
+        with connections[config.from_connection_name].cursor() as cursor:
+            cursor.execute(f"select count(*) from {config.table_name}")
+            source_count = cursor.fetchone()[0]
+        # NOTE: the difference in counts is the least number of rows missing from the source (rows added to the source
+        #   hide some) so only compare the keys when that isn't already over
+        missing = target_count - source_count
+        at_least = "at least "
+        if missing <= delete_limit.max_rows:
+            missing = count_target_only(config.from_connection_name, config.to_connection_name, config.table_name,
+                                        config.pk_field_name, target_pk_field_name,
+                                        getattr(settings, 'SYNC_CHUNK_SIZE', 1000), target_condition)
+            at_least = ""
+        if missing > delete_limit.max_rows:
+            raise IntegrityError(f"{at_least}[{missing}] of [{target_count}] target rows "
+                                 f"({missing * 100 / target_count:.1f}%) are not in the source which is over the "
+                                 f"delete threshold of {config.delete_threshold}%; nothing was synced!")
+    log.debug(f"target rows: {target_count} not in source: {'-' if missing is None else missing} "
+              f"marked deleted: {marked_count}; deleting at most {delete_limit.max_rows}")
+    return delete_limit
+
+
+def delete_rows(log: LogBuffer, config: SyncConfiguration, writer: BatchWriter, keys: list, delete_mode: str,
+                delete_limit: DeleteLimit) -> int:
+    """
+    deletes (or marks deleted) the target rows of a chunk that are not in the source; returns the number of rows
+    """
+    if delete_mode == 'soft' and delete_limit.marked_count:
+        keys = writer.unmarked_keys(keys, config.soft_delete_field_name)
+    if not keys:
+        return 0
+    delete_limit.take(len(keys))
+    if delete_mode == 'soft':
+        deleted = writer.mark_deleted(keys, config.soft_delete_field_name)
+        log.debug("marked deleted recs: %s", deleted)
+    else:
+        deleted = writer.delete(keys)
+        log.debug("deleted recs: %s", deleted)
+    return deleted
+
+
+def sync_range(log: LogBuffer, config: SyncConfiguration, diff_options: dict, delete_mode: str = 'none',
+               lower=None, upper=None, checkpoint: RunCheckpoint = None, range_idx: int = 0,
+               delete_limit: DeleteLimit = None, stats: SyncStats = None) -> SyncStats:
+    """
+    diffs the source and target (or the lower < pk <= upper range of them) a chunk at a time (see diff.py) and writes
+    the differences to the target in batches; the counts are added to stats (a new SyncStats if not passed) as each
+    chunk is written
+    target rows not in the source are deleted (or marked) with each chunk when deleting (see get_delete_limit)
+    the last key of each chunk is saved to the checkpoint for range_idx once the chunk is written
+    """
+    if stats is None:
+        stats = SyncStats()
+    writer = None
+    for diff in diff_table(config.from_connection_name, config.to_connection_name, config.table_name,
+                           config.pk_field_name, lower=lower, upper=upper, **diff_options):
+        log.debug("chunk: %s", diff)
+        stats.add(diff)
+        if writer is None:
+            writer = BatchWriter(config.to_connection_name, config.table_name,
+                                 config.target_column(config.pk_field_name), diff.columns, config.batch_size)
+        started = time.monotonic()
+        if diff.updates:
+            updated_recs = writer.update(diff.updates, diff.pk_index)
+            stats.updated += updated_recs
+            log.debug("updated recs: %s", updated_recs)
+        if diff.inserts:
+            updated_recs = writer.insert(diff.inserts)
+            stats.inserted += updated_recs
+            log.debug("inserted recs: %s", updated_recs)
+        if delete_mode != 'none' and diff.target_only:
+            stats.deleted += delete_rows(log, config, writer, diff.target_only, delete_mode, delete_limit)
+        if delete_mode == 'soft' and diff.source_keys and delete_limit.marked_count:
+            # NOTE: only rows marked before the run can be back in the source
+            writer.unmark(diff.source_keys, config.soft_delete_field_name)
+        stats.add_chunk_stats(diff, time.monotonic() - started, range_idx)
+        if checkpoint and diff.source_keys:
+            checkpoint.update(range_idx, last_pk=diff.source_keys[-1])
+    if checkpoint:
+        checkpoint.update(range_idx, done=True)
+    return stats
+
+
+def sync_partitions(log: LogBuffer, config: SyncConfiguration, diff_options: dict, delete_mode: str,
+                    checkpoint: RunCheckpoint, delete_limit: DeleteLimit = None, stats: SyncStats = None) -> SyncStats:
+    """
+    syncs the key ranges of the checkpoint that aren't done on a thread each; returns the combined stats (added to
+    stats if passed)
+    NOTE: each partition logs to its own buffer which is added to the run log in partition order when done; the
+        counts of failed partitions are kept too
+    """
+    pending = checkpoint.pending()
+    log.info(f"syncing [{len(pending)}] of [{len(checkpoint.ranges)}] partitions")
+    if stats is None:
+        stats = SyncStats()
+    if not pending:
+        return stats
+    partition_logs = {}
+    partition_stats = {}
+    for idx, lower, upper in pending:
+        partition_logs[idx] = LogBuffer(logger=log.logger, level=log.level, color_output=log.color_output)
+        partition_stats[idx] = SyncStats(f"partition {idx + 1} ({lower}, {upper}]")
+
+    def sync_partition(idx, lower, upper):
+        try:
+            sync_range(partition_logs[idx], config, diff_options, delete_mode, lower, upper, checkpoint, idx,
+                       delete_limit, partition_stats[idx])
+        finally:
+            # the thread's database connections aren't cleaned up by a request so close them here
+            connections.close_all()
+
+    with ThreadPoolExecutor(max_workers=len(pending), thread_name_prefix="sync-partition") as executor:
+        futures = [executor.submit(sync_partition, idx, lower, upper) for idx, lower, upper in pending]
+    error = None
+    for (idx, lower, upper), future in zip(pending, futures):
+        if str(partition_logs[idx]):
+            log.log(str(partition_logs[idx]).rstrip(), log.level)
+        partition_logs[idx].close()
+        try:
+            future.result()
+        except Exception as ex:
+            log.fatal(f"partition {idx + 1} ({lower}, {upper}] failed: {ex}")
+            error = error or ex
+        log.info(str(partition_stats[idx]))
+        stats.merge(partition_stats[idx])
+    if error:
+        raise error
+    return stats
 
 
 class Command(BaseCommand):
     filter_type = "table"
     filter = None
     color = None
+    workers = 1
+    resume = False
 
     help = """
         usage: ./manage.py sync [option] [parameter]
@@ -157,6 +433,10 @@ class Command(BaseCommand):
             process all active alerts
         example: ./manage.py sync alert weekly
             process all active alerts with the weekly category
+        example: ./manage.py sync channel nightly --workers 4
+            process the nightly channel syncing up to 4 configurations at a time
+        example: ./manage.py sync table crm_awards --resume
+            continue the last failed run of the table from its checkpoint
     """
 
     def sync_configurations(self):
@@ -196,27 +476,14 @@ class Command(BaseCommand):
             run_log_summary += str(run_log)
             # for each active config reset and sync
             # NOTE: there will be a run for each table synced for logging and errors
-            for config in configs:
-                # NOTE: clear also resets the log level to initial value (see LogBuffer)
-                run_log.clear()
-                if config.log_level_override and config.log_level_override != run_log.level:
-                    run_log.debug(f"config: {str(config)}")
-                    run_log.debug(f"overriding run log level from [{run_log.level}] to [{str(config.log_level_override)}]")
-                    run_log.level = config.log_level_override
-                # create a configuration run and process
-                run = SyncRun.objects.create(sync=config)
-                log.debug(f"created {str(run)}")
-                try:
-                    sync_config(run_log, config)
-                    run.has_succeeded = True
-                except Exception as run_ex:
-                    run_log.fatal(run_ex)
-                    run.has_succeeded = False
-                finally:
-                    run.log = run_log_prefix + str(run_log)
-                    run.end_date = timezone.now()
-                    run.save()
-                    run_log_summary += str(run_log)
+            if self.workers > 1 and len(configs) > 1:
+                for config_log in self.sync_parallel(list(configs), run_log_prefix):
+                    run_log_summary += config_log
+            else:
+                for config in configs:
+                    # NOTE: clear also resets the log level to initial value (see LogBuffer)
+                    run_log.clear()
+                    run_log_summary += self.sync_run(config, run_log, run_log_prefix)
             log.always(run_log_summary)
 
         except Exception as ex:
@@ -230,7 +497,91 @@ class Command(BaseCommand):
         log.info("info")
         log.fatal("fatal")
 
-        return str(log)
+        output = str(log)
+        log.close()
+        return output
+
+    def sync_run(self, config, run_log, run_log_prefix):
+        """
+        creates a run for the config and syncs it; returns the run log
+        NOTE: only writes to run_log since it runs on the worker threads with --workers
+        """
+        if config.log_level_override and config.log_level_override != run_log.level:
+            run_log.debug(f"config: {str(config)}")
+            run_log.debug(f"overriding run log level from [{run_log.level}] to [{str(config.log_level_override)}]")
+            run_log.level = config.log_level_override
+        # create a configuration run and process
+        run = SyncRun.objects.create(sync=config)
+        run_log.debug(f"created {str(run)}")
+        heartbeat = Heartbeat(run)
+        heartbeat.start()
+        try:
+            sync_config(run_log, config, run, self.resume)
+            run.has_succeeded = True
+        except Exception as run_ex:
+            run_log.fatal(run_ex)
+            run.has_succeeded = False
+        finally:
+            heartbeat.stop()
+            if SyncRun.objects.filter(pk=run.pk, end_date__isnull=False).exists():
+                run_log.warning(f"{str(run)} was closed as stale while running; keeping it closed as failed")
+            run.log = run_log_prefix + str(run_log)
+            run.end_date = timezone.now()
+            save_run(run)
+            run_log.close()
+        return str(run_log)
+
+    def sync_parallel(self, configs, run_log_prefix):
+        """
+        syncs the configs on self.workers threads; returns the run logs in config order
+        NOTE: a config only starts when both of its connections are running fewer than SYNC_WORKERS_PER_CONNECTION
+            syncs so a channel of tables on one slow database doesn't take every worker
+        """
+        per_connection = getattr(settings, 'SYNC_WORKERS_PER_CONNECTION', 2)
+        pending = list(configs)
+        running = {}
+        config_logs = {}
+        condition = threading.Condition()
+
+        def connection_names(config):
+            return {config.from_connection_name, config.to_connection_name}
+
+        def is_available(config):
+            return all(running.get(name, 0) < per_connection for name in connection_names(config))
+
+        def worker():
+            while True:
+                with condition:
+                    while True:
+                        if not pending:
+                            return
+                        config = next((pending_config for pending_config in pending if is_available(pending_config)),
+                                      None)
+                        if config is not None:
+                            break
+                        condition.wait()
+                    pending.remove(config)
+                    for name in connection_names(config):
+                        running[name] = running.get(name, 0) + 1
+                try:
+                    # each config gets its own buffer since they log at the same time
+                    run_log = LogBuffer(logger=logger, color_output=self.color)
+                    config_logs[config.pk] = self.sync_run(config, run_log, run_log_prefix)
+                finally:
+                    # the thread's database connections aren't cleaned up by a request so close them here
+                    connections.close_all()
+                    with condition:
+                        for name in connection_names(config):
+                            running[name] -= 1
+                        condition.notify_all()
+
+        threads = [threading.Thread(target=worker, name=f"sync-{idx}")
+                   for idx in range(min(self.workers, len(configs)))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return [config_logs.get(config.pk, "") for config in configs]
 
     def sync_alerts(self):
         log_msg = "syncing alerts..."
@@ -243,9 +594,15 @@ class Command(BaseCommand):
 
     def add_arguments(self, parser):
         parser.add_argument('option', nargs='+', type=str)
+        parser.add_argument('--workers', type=int, default=1,
+                            help="number of configurations to sync at the same time (default 1)")
+        parser.add_argument('--resume', action='store_true',
+                            help="carry on from the checkpoint of the last failed run of each configuration")
 
     def handle(self, *args, **options):
         params = options['option']
+        self.workers = max(1, options.get('workers') or 1)
+        self.resume = options.get('resume', False)
         if "?" in params or "help" in params:
             self.stdout.write(self.style.SUCCESS(self.help))
         else:
@@ -0,0 +1,19 @@
+# Generated by Django 3.2.14 on 2026-10-18 15:12
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ds_sync', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='syncconfiguration',
+            name='batch_size',
+            field=models.PositiveIntegerField(default=500, help_text='Number of rows written to the target per statement and transaction.', validators=[django.core.validators.MinValueValidator(1)]),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 3.2.14 on 2026-10-18 15:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ds_sync', '0002_syncconfiguration_batch_size'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='syncconfiguration',
+            name='watermark_field_name',
+            field=models.CharField(blank=True, help_text='Optional column that increases whenever a row changes (modified timestamp, rowversion).  When set only rows changed since the last successful run are read; deletes are not picked up.', max_length=800, null=True, verbose_name='watermark'),
+        ),
+        migrations.AddField(
+            model_name='syncrun',
+            name='watermark',
+            field=models.CharField(blank=True, editable=False, help_text='Highest watermark value synced by this run', max_length=255, null=True),
+        ),
+    ]
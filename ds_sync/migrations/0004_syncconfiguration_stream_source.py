@@ -0,0 +1,18 @@
+# Generated by Django 3.2.14 on 2026-10-18 16:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ds_sync', '0003_watermark'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='syncconfiguration',
+            name='stream_source',
+            field=models.BooleanField(default=False, help_text='Read the source table with one query through a server side cursor instead of a query per chunk.  Ignored for mysql when both connections are the same.'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.14 on 2026-10-18 16:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ds_sync', '0004_syncconfiguration_stream_source'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='syncconfiguration',
+            name='compare_mode',
+            field=models.CharField(choices=[('rows', 'Rows'), ('hash', 'Hash')], default='rows', help_text='How changed rows are found.  Rows reads every row from both sides and compares the values.  Hash has each database return an md5 per row and only reads the changed rows; both connections must be the same kind of database (mysql, postgres or sqlite).', max_length=10),
+        ),
+    ]
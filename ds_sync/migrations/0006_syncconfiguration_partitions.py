@@ -0,0 +1,19 @@
+# Generated by Django 3.2.14 on 2026-10-18 17:41
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ds_sync', '0005_syncconfiguration_compare_mode'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='syncconfiguration',
+            name='partitions',
+            field=models.PositiveSmallIntegerField(default=1, help_text='Number of primary key ranges synced at the same time (1-32).  Each range uses its own source and target connection.', validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(32)]),
+        ),
+    ]
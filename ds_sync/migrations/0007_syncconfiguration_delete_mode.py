@@ -0,0 +1,29 @@
+# Generated by Django 3.2.14 on 2026-10-18 18:26
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ds_sync', '0006_syncconfiguration_partitions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='syncconfiguration',
+            name='delete_mode',
+            field=models.CharField(choices=[('none', 'None'), ('hard', 'Delete'), ('soft', 'Mark deleted')], default='none', help_text='What happens to target rows that are no longer in the source.  Only found on full runs (not incremental watermark runs).', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='syncconfiguration',
+            name='soft_delete_field_name',
+            field=models.CharField(blank=True, help_text='Target column set to 1 for rows no longer in the source when marking deleted (set back to 0 if the row returns)', max_length=800, null=True, verbose_name='soft delete field'),
+        ),
+        migrations.AddField(
+            model_name='syncconfiguration',
+            name='delete_threshold',
+            field=models.PositiveSmallIntegerField(default=10, help_text='Largest percent of the target rows a run may delete (0-100); the run fails without deleting anything if more would be deleted.', validators=[django.core.validators.MaxValueValidator(100)]),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 3.2.14 on 2026-10-18 19:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ds_sync', '0007_syncconfiguration_delete_mode'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='syncconfiguration',
+            name='include_columns',
+            field=models.CharField(blank=True, help_text='Comma separated list of the source columns to sync; every column if blank.  The primary key and watermark are always synced.', max_length=2000, null=True),
+        ),
+        migrations.AddField(
+            model_name='syncconfiguration',
+            name='exclude_columns',
+            field=models.CharField(blank=True, help_text="Comma separated list of source columns not to sync (large blob or text columns the target doesn't need).  Left out of the source query so they are never read.", max_length=2000, null=True),
+        ),
+        migrations.AddField(
+            model_name='syncconfiguration',
+            name='column_map',
+            field=models.CharField(blank=True, help_text="Comma separated source:target pairs for columns with a different name in the target.  Ex: 'cust_no:customer_id, nm:name'", max_length=2000, null=True),
+        ),
+    ]
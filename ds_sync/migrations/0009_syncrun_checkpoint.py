@@ -0,0 +1,24 @@
+# Generated by Django 3.2.14 on 2026-10-18 19:41
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ds_sync', '0008_syncconfiguration_columns'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='syncrun',
+            name='checkpoint',
+            field=models.JSONField(blank=True, editable=False, encoder=django.core.serializers.json.DjangoJSONEncoder, help_text='Last primary key written in each key range; used by sync --resume', null=True),
+        ),
+        migrations.AddField(
+            model_name='syncrun',
+            name='heartbeat_date',
+            field=models.DateTimeField(blank=True, editable=False, help_text='Saved with each checkpoint; runs without a recent heartbeat are considered dead', null=True),
+        ),
+    ]
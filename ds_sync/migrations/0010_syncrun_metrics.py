@@ -0,0 +1,91 @@
+# Generated by Django 3.2.14 on 2026-10-18 20:12
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ds_sync', '0009_syncrun_checkpoint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncTrend',
+            fields=[
+            ],
+            options={
+                'verbose_name': 'Sync Trend',
+                'proxy': True,
+                'indexes': [],
+                'constraints': [],
+            },
+            bases=('ds_sync.syncconfiguration',),
+        ),
+        migrations.AddField(
+            model_name='syncrun',
+            name='bytes_read',
+            field=models.PositiveBigIntegerField(blank=True, editable=False, help_text='About how many bytes were read from the source and target', null=True),
+        ),
+        migrations.AddField(
+            model_name='syncrun',
+            name='chunk_stats',
+            field=models.JSONField(blank=True, editable=False, encoder=django.core.serializers.json.DjangoJSONEncoder, help_text='Counts and timings for each chunk (up to the first 1000)', null=True),
+        ),
+        migrations.AddField(
+            model_name='syncrun',
+            name='duration_seconds',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='syncrun',
+            name='rows_compared',
+            field=models.PositiveBigIntegerField(blank=True, editable=False, help_text='Source rows checked against the target', null=True),
+        ),
+        migrations.AddField(
+            model_name='syncrun',
+            name='rows_deleted',
+            field=models.PositiveBigIntegerField(blank=True, editable=False, help_text='Target rows deleted or marked deleted', null=True),
+        ),
+        migrations.AddField(
+            model_name='syncrun',
+            name='rows_inserted',
+            field=models.PositiveBigIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='syncrun',
+            name='rows_per_second',
+            field=models.FloatField(blank=True, editable=False, help_text='Rows compared per second over the whole run', null=True),
+        ),
+        migrations.AddField(
+            model_name='syncrun',
+            name='rows_read',
+            field=models.PositiveBigIntegerField(blank=True, editable=False, help_text='Rows read from the source and target', null=True),
+        ),
+        migrations.AddField(
+            model_name='syncrun',
+            name='rows_unchanged',
+            field=models.PositiveBigIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='syncrun',
+            name='rows_updated',
+            field=models.PositiveBigIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='syncrun',
+            name='source_seconds',
+            field=models.FloatField(blank=True, editable=False, help_text='Time spent reading the source', null=True),
+        ),
+        migrations.AddField(
+            model_name='syncrun',
+            name='target_seconds',
+            field=models.FloatField(blank=True, editable=False, help_text='Time spent reading the target', null=True),
+        ),
+        migrations.AddField(
+            model_name='syncrun',
+            name='write_seconds',
+            field=models.FloatField(blank=True, editable=False, help_text='Time spent writing to the target', null=True),
+        ),
+    ]
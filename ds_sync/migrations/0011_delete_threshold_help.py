@@ -0,0 +1,19 @@
+# Generated by Django 3.2.14 on 2026-10-18 21:05
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ds_sync', '0010_syncrun_metrics'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='syncconfiguration',
+            name='delete_threshold',
+            field=models.PositiveSmallIntegerField(default=10, help_text='Largest percent of the target rows a run may delete (0-100); checked with row counts before the run and as rows are deleted.  The run fails once it would delete more.', validators=[django.core.validators.MaxValueValidator(100)]),
+        ),
+    ]
@@ -1,7 +1,9 @@
 from django.db import models
 from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
 from django.core.validators import MaxValueValidator, MinValueValidator
 from tagulous.models import TagTreeModel, TagModel, TagField, SingleTagField
+from .watermark import load_watermark
 
 log_level_choices = (
     (10, 'Debug'),
@@ -9,6 +11,26 @@ log_level_choices = (
     (30, 'Warning')
 )
 
+compare_mode_choices = (
+    ('rows', 'Rows'),
+    ('hash', 'Hash')
+)
+
+delete_mode_choices = (
+    ('none', 'None'),
+    ('hard', 'Delete'),
+    ('soft', 'Mark deleted')
+)
+
+
+def split_columns(value):
+    """
+    returns the comma separated column names as a list
+    """
+    if not value:
+        return []
+    return [column.strip() for column in value.split(',') if column.strip()]
+
 
 def get_connection_choices():
     return [
@@ -60,6 +82,48 @@ class SyncConfiguration(models.Model):
         help_text="Allows syncing by group(s) of configurations.  "
                   "Ex: 'daily', 'weekly' or 'customer, daily'"
     )
+    include_columns = models.CharField(max_length=2000, null=True, blank=True,
+                                       help_text="Comma separated list of the source columns to sync; every column if "
+                                                 "blank.  The primary key and watermark are always synced.")
+    exclude_columns = models.CharField(max_length=2000, null=True, blank=True,
+                                       help_text="Comma separated list of source columns not to sync (large blob or "
+                                                 "text columns the target doesn't need).  Left out of the source "
+                                                 "query so they are never read.")
+    column_map = models.CharField(max_length=2000, null=True, blank=True,
+                                  help_text="Comma separated source:target pairs for columns with a different name in "
+                                            "the target.  Ex: 'cust_no:customer_id, nm:name'")
+    watermark_field_name = models.CharField(max_length=800, null=True, blank=True, verbose_name="watermark",
+                                            help_text="Optional column that increases whenever a row changes (modified "
+                                                      "timestamp, rowversion).  When set only rows changed since the "
+                                                      "last successful run are read; deletes are not picked up.")
+    stream_source = models.BooleanField(default=False,
+                                        help_text="Read the source table with one query through a server side cursor "
+                                                  "instead of a query per chunk.  Ignored for mysql when both "
+                                                  "connections are the same.")
+    compare_mode = models.CharField(max_length=10, choices=compare_mode_choices, default='rows',
+                                    help_text="How changed rows are found.  Rows reads every row from both sides and "
+                                              "compares the values.  Hash has each database return an md5 per row "
+                                              "and only reads the changed rows; both connections must be the same "
+                                              "kind of database (mysql, postgres or sqlite).")
+    partitions = models.PositiveSmallIntegerField(default=1, validators=[MinValueValidator(1), MaxValueValidator(32)],
+                                                  help_text="Number of primary key ranges synced at the same time "
+                                                            "(1-32).  Each range uses its own source and target "
+                                                            "connection.")
+    delete_mode = models.CharField(max_length=10, choices=delete_mode_choices, default='none',
+                                   help_text="What happens to target rows that are no longer in the source.  Only "
+                                             "found on full runs (not incremental watermark runs).")
+    soft_delete_field_name = models.CharField(max_length=800, null=True, blank=True, verbose_name="soft delete field",
+                                              help_text="Target column set to 1 for rows no longer in the source when "
+                                                        "marking deleted (set back to 0 if the row returns)")
+    delete_threshold = models.PositiveSmallIntegerField(default=10, validators=[MaxValueValidator(100)],
+                                                        help_text="Largest percent of the target rows a run may "
+                                                                  "delete (0-100); checked against the target keys "
+                                                                  "missing from the source before anything is "
+                                                                  "written and again as rows are deleted.  The run "
+                                                                  "fails once it would delete more.")
+    batch_size = models.PositiveIntegerField(default=500, validators=[MinValueValidator(1)],
+                                             help_text="Number of rows written to the target per statement and "
+                                                       "transaction.")
     notes = models.TextField(max_length=2000, null=True, blank=True)
     is_active = models.BooleanField(default=True, verbose_name="active")
     log_level_override = models.PositiveSmallIntegerField(choices=log_level_choices, null=True, blank=True,
@@ -75,12 +139,83 @@ class SyncConfiguration(models.Model):
     def __str__(self):
         return f"[{str(self.from_connection_name)}] -> [{str(self.to_connection_name)}] : {str(self.table_name)}"
 
+    def include_column_list(self):
+        return split_columns(self.include_columns)
+
+    def exclude_column_list(self):
+        return split_columns(self.exclude_columns)
+
+    def column_map_dict(self):
+        """
+        returns the column_map as a dict of source column to target column
+        """
+        column_map = {}
+        for pair in split_columns(self.column_map):
+            source, _sep, target = pair.partition(':')
+            column_map[source.strip()] = target.strip()
+        return column_map
+
+    def target_column(self, column):
+        """
+        returns the name of the source column in the target
+        """
+        return self.column_map_dict().get(column, column)
+
+    def last_watermark(self):
+        """
+        returns the watermark of the last successful run or None to sync everything
+        """
+        if not self.watermark_field_name:
+            return None
+        run = self.syncrun_set.filter(has_succeeded=True, watermark__isnull=False).order_by('-start_date').first()
+        return load_watermark(run.watermark) if run else None
+
+    def resumable_run(self):
+        """
+        returns the latest failed (or stale) run with a checkpoint since the last successful run or None
+        """
+        runs = self.syncrun_set.filter(has_succeeded=False, checkpoint__isnull=False)
+        last_success = self.syncrun_set.filter(has_succeeded=True).order_by('-start_date').first()
+        if last_success:
+            runs = runs.filter(start_date__gt=last_success.start_date)
+        return runs.order_by('-start_date').first()
+
 
 class SyncRun(models.Model):
     sync = models.ForeignKey(SyncConfiguration, on_delete=models.CASCADE)
     start_date = models.DateTimeField(auto_now_add=True, editable=False)
     end_date = models.DateTimeField(null=True, blank=True, editable=False)
     has_succeeded = models.BooleanField(null=True)
+    watermark = models.CharField(max_length=255, null=True, blank=True, editable=False,
+                                 help_text="Highest watermark value synced by this run")
+    checkpoint = models.JSONField(null=True, blank=True, editable=False, encoder=DjangoJSONEncoder,
+                                  help_text="Last primary key written in each key range; used by sync --resume")
+    heartbeat_date = models.DateTimeField(null=True, blank=True, editable=False,
+                                          help_text="Saved with each checkpoint; runs without a recent heartbeat "
+                                                    "are considered dead")
+    # counts and timings for the run; null for runs that failed or were skipped (see sync.record_run_stats)
+    rows_read = models.PositiveBigIntegerField(null=True, blank=True, editable=False,
+                                               help_text="Rows read from the source and target")
+    rows_compared = models.PositiveBigIntegerField(null=True, blank=True, editable=False,
+                                                   help_text="Source rows checked against the target")
+    rows_inserted = models.PositiveBigIntegerField(null=True, blank=True, editable=False)
+    rows_updated = models.PositiveBigIntegerField(null=True, blank=True, editable=False)
+    rows_unchanged = models.PositiveBigIntegerField(null=True, blank=True, editable=False)
+    rows_deleted = models.PositiveBigIntegerField(null=True, blank=True, editable=False,
+                                                  help_text="Target rows deleted or marked deleted")
+    bytes_read = models.PositiveBigIntegerField(null=True, blank=True, editable=False,
+                                                help_text="About how many bytes were read from the source and target")
+    source_seconds = models.FloatField(null=True, blank=True, editable=False,
+                                       help_text="Time spent reading the source")
+    target_seconds = models.FloatField(null=True, blank=True, editable=False,
+                                       help_text="Time spent reading the target")
+    write_seconds = models.FloatField(null=True, blank=True, editable=False,
+                                      help_text="Time spent writing to the target")
+    duration_seconds = models.FloatField(null=True, blank=True, editable=False)
+    rows_per_second = models.FloatField(null=True, blank=True, editable=False,
+                                        help_text="Rows compared per second over the whole run")
+    chunk_stats = models.JSONField(null=True, blank=True, editable=False, encoder=DjangoJSONEncoder,
+                                   help_text="Counts and timings for each chunk (up to the first 1000)")
     # msg = models.CharField(max_length=1024, null=True, blank=True)
     log = models.TextField(null=True, blank=True)
 
@@ -96,6 +231,15 @@ class SyncRun(models.Model):
         return f"{str(self.sync)} ({str(self.start_date)} - {str(self.end_date)})"
 
 
+class SyncTrend(SyncConfiguration):
+    """
+    Configurations with the averages of their recent runs (see SyncTrendAdmin)
+    """
+    class Meta:
+        proxy = True
+        verbose_name = "Sync Trend"
+
+
 class AlertCategoryTag(TagModel):
     """
     Channels or groups to place configurations in.
@@ -0,0 +1,65 @@
+"""
+Watermark values saved on sync runs.  The value is kept as json with its type so the next run filters with the same
+kind of value that was read (a datetime stays a datetime with its time zone, a rowversion stays bytes) instead of
+the text of it.
+
+    {"type": "datetime", "value": "2024-01-01T00:00:00+00:00"}
+
+NOTE: watermarks saved before the type was kept are plain text and are returned as is
+"""
+import datetime
+import decimal
+import json
+import uuid
+
+_loaders = {
+    'bytes': bytes.fromhex,
+    'datetime': datetime.datetime.fromisoformat,
+    'date': datetime.date.fromisoformat,
+    'time': datetime.time.fromisoformat,
+    'decimal': decimal.Decimal,
+    'uuid': uuid.UUID,
+    'int': int,
+    'float': float,
+    'str': str,
+}
+
+
+def dump_watermark(value):
+    """
+    returns the watermark as json with its type (None for None)
+    """
+    if value is None:
+        return None
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        value_type, value = 'bytes', bytes(value).hex()
+    elif isinstance(value, datetime.datetime):
+        value_type, value = 'datetime', value.isoformat()
+    elif isinstance(value, datetime.date):
+        value_type, value = 'date', value.isoformat()
+    elif isinstance(value, datetime.time):
+        value_type, value = 'time', value.isoformat()
+    elif isinstance(value, decimal.Decimal):
+        value_type, value = 'decimal', str(value)
+    elif isinstance(value, uuid.UUID):
+        value_type, value = 'uuid', str(value)
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        value_type = type(value).__name__
+    else:
+        value_type, value = 'str', str(value)
+    return json.dumps({'type': value_type, 'value': value})
+
+
+def load_watermark(text):
+    """
+    returns the watermark saved by dump_watermark as its type; text that isn't (older runs) is returned as is
+    """
+    if text is None:
+        return None
+    try:
+        saved = json.loads(text)
+    except ValueError:
+        return text
+    if not isinstance(saved, dict) or saved.get('type') not in _loaders:
+        return text
+    return _loaders[saved['type']](saved['value'])
@@ -0,0 +1,195 @@
+"""
+Writes the rows found by the diff (see diff.py) to the target table in batches.  New rows go in as multi row inserts
+and changed rows as a multi row upsert where the backend has one (mysql ON DUPLICATE KEY UPDATE, postgres and sqlite
+ON CONFLICT) otherwise an executemany of the update.  Rows no longer in the source are deleted or marked by key as
+each chunk is diffed, up to the run's DeleteLimit.  Each batch runs in its own transaction.
+"""
+import logging
+import threading
+
+from django.db import IntegrityError, connections, transaction
+
+logger = logging.getLogger(__name__)
+
+
+class BatchWriter(object):
+    """
+    Batched insert/update statements for one table; the sql is built once per batch size instead of once per row
+    """
+    def __init__(self, connection_name, table_name, pk_field_name, columns, batch_size=500):
+        self.connection_name = connection_name
+        self.connection = connections[connection_name]
+        self.table_name = table_name
+        self.pk_field_name = pk_field_name
+        self.columns = list(columns)
+        # NOTE: some backends limit the number of parameters per statement (sqlite)
+        batch_size = batch_size or 1
+        self.batch_size = max(1, min(batch_size,
+                                     self.connection.ops.bulk_batch_size(self.columns, [None] * batch_size)))
+        self.vendor = self.connection.vendor
+        self._sql = {}
+
+    def has_upsert(self):
+        if self.vendor == 'sqlite':
+            return self.connection.Database.sqlite_version_info >= (3, 24, 0)
+        return self.vendor in ('mysql', 'postgresql')
+
+    def values_sql(self, row_count):
+        row_sql = "(" + ", ".join(["%s"] * len(self.columns)) + ")"
+        return ", ".join([row_sql] * row_count)
+
+    def insert_sql(self, row_count):
+        key = ('insert', row_count)
+        if key not in self._sql:
+            self._sql[key] = (f"insert into {self.table_name} ({', '.join(self.columns)}) "
+                              f"values {self.values_sql(row_count)}")
+        return self._sql[key]
+
+    def upsert_sql(self, row_count):
+        key = ('upsert', row_count)
+        if key not in self._sql:
+            update_columns = [column for column in self.columns if column != self.pk_field_name]
+            if self.vendor == 'mysql':
+                conflict = "on duplicate key update " + ", ".join(f"{column}=values({column})"
+                                                                  for column in update_columns)
+            else:
+                conflict = (f"on conflict ({self.pk_field_name}) do update set " +
+                            ", ".join(f"{column}=excluded.{column}" for column in update_columns))
+            self._sql[key] = f"{self.insert_sql(row_count)} {conflict}"
+        return self._sql[key]
+
+    def update_sql(self):
+        key = ('update', 1)
+        if key not in self._sql:
+            self._sql[key] = (f"update {self.table_name} set {', '.join(column + '=%s' for column in self.columns)} "
+                              f"where {self.pk_field_name}=%s")
+        return self._sql[key]
+
+    def batches(self, rows):
+        for idx in range(0, len(rows), self.batch_size):
+            yield rows[idx:idx + self.batch_size]
+
+    @staticmethod
+    def flatten(rows):
+        return [value for row in rows for value in row]
+
+    def insert(self, rows):
+        """
+        inserts the rows; returns the number of rows written
+        """
+        written = 0
+        for batch in self.batches(rows):
+            with transaction.atomic(using=self.connection_name), self.connection.cursor() as cursor:
+                cursor.execute(self.insert_sql(len(batch)), self.flatten(batch))
+            written += len(batch)
+        return written
+
+    def update(self, rows, pk_index):
+        """
+        updates the rows by primary key; returns the number of rows written
+        """
+        written = 0
+        upsert = self.has_upsert()
+        for batch in self.batches(rows):
+            with transaction.atomic(using=self.connection_name), self.connection.cursor() as cursor:
+                if upsert:
+                    cursor.execute(self.upsert_sql(len(batch)), self.flatten(batch))
+                else:
+                    cursor.executemany(self.update_sql(), [list(row) + [row[pk_index]] for row in batch])
+            written += len(batch)
+        return written
+
+    def where_keys(self, keys):
+        return f"{self.pk_field_name} in ({', '.join(['%s'] * len(keys))})"
+
+    def delete(self, keys):
+        """
+        deletes the rows by primary key; returns the number of rows deleted
+        """
+        deleted = 0
+        for batch in self.batches(keys):
+            with transaction.atomic(using=self.connection_name), self.connection.cursor() as cursor:
+                cursor.execute(f"delete from {self.table_name} where {self.where_keys(batch)}", batch)
+                deleted += cursor.rowcount
+        return deleted
+
+    def mark_deleted(self, keys, field_name, value=1):
+        """
+        sets the soft delete field of the rows by primary key (unless already set); returns the number of rows marked
+        """
+        marked = 0
+        for batch in self.batches(keys):
+            with transaction.atomic(using=self.connection_name), self.connection.cursor() as cursor:
+                cursor.execute(f"update {self.table_name} set {field_name}=%s where {self.where_keys(batch)} "
+                               f"and {unmarked_sql(field_name)}", [value] + list(batch))
+                marked += cursor.rowcount
+        return marked
+
+    def select_keys(self, keys, where):
+        """
+        returns the keys of the rows that also match the where clause
+        """
+        selected = []
+        for batch in self.batches(keys):
+            with self.connection.cursor() as cursor:
+                cursor.execute(f"select {self.pk_field_name} from {self.table_name} where {self.where_keys(batch)} "
+                               f"and {where}", batch)
+                selected += [row[0] for row in cursor.fetchall()]
+        return selected
+
+    def unmarked_keys(self, keys, field_name):
+        """
+        returns the keys whose soft delete field is not already set
+        """
+        return self.select_keys(keys, unmarked_sql(field_name))
+
+    def unmark(self, keys, field_name):
+        """
+        clears the soft delete field for rows that are back in the source; returns the number of rows unmarked
+        NOTE: the marked rows are looked up first so only they are updated (an update takes locks on every row it
+            looks at even when nothing changes)
+        """
+        marked = self.select_keys(keys, f"not {unmarked_sql(field_name)}")
+        for batch in self.batches(marked):
+            with transaction.atomic(using=self.connection_name), self.connection.cursor() as cursor:
+                cursor.execute(f"update {self.table_name} set {field_name}=0 where {self.where_keys(batch)}", batch)
+        return len(marked)
+
+    def count(self, where=None):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f"select count(*) from {self.table_name}" + (f" where {where}" if where else ""))
+            return cursor.fetchone()[0]
+
+
+def unmarked_sql(field_name):
+    return f"({field_name} is null or {field_name} = 0)"
+
+
+class DeleteLimit(object):
+    """
+    The most target rows a run may delete (or mark deleted) across its chunks and partitions; from the target row
+    count before the run and the configuration's delete threshold
+    target_count: target rows (not already marked deleted) before the run
+    marked_count: target rows already marked deleted before the run (soft deletes)
+    """
+    def __init__(self, target_count, threshold, marked_count=0):
+        self.target_count = target_count
+        self.threshold = threshold
+        self.marked_count = marked_count
+        self.max_rows = target_count * threshold // 100
+        self.deleted = 0
+        self._lock = threading.Lock()
+
+    def take(self, count):
+        """
+        counts rows about to be deleted; raises IntegrityError (without counting them) if that goes over the limit
+        """
+        with self._lock:
+            if self.deleted + count > self.max_rows:
+                raise IntegrityError(f"over [{self.deleted + count}] of [{self.target_count}] target rows are not in "
+                                     f"the source which is over the delete threshold of {self.threshold}%; "
+                                     f"stopped deleting after [{self.deleted}]!")
+            self.deleted += count
+
+    def __str__(self):
+        return f"deleted {self.deleted} of at most {self.max_rows} ({self.threshold}% of {self.target_count})"